@@ -1,28 +1,128 @@
 import json
-import cv2
 import os
 import websocket
 import subprocess
 import time
 import asyncio
 import threading
-from datetime import datetime
 from urllib.parse import urlparse, urlencode
-import numpy as np
 from onvif import ONVIFCamera
 from zeep.exceptions import Fault
-import urllib.request
 from concurrent.futures import ThreadPoolExecutor
 import queue
+import shutil
+from snmp_client import SnmpClient
+from http_probe import HttpProbe
+from occupancy_store import query_devices
+from sq_workers import SQWorkerPool
+from edge_scheduler import EdgeScheduler, ScheduleError
+from result_transport import OutboundQueue
+from config_sync import ConfigSync
+import edge_log
+from edge_log import get_logger, rate_limited, sampled
 
 CONFIG_FILE = "/home/metro/facility_config.json"
 WS_BASE_URL = "wss://10.3.158.111:3001/diagnostics"
 ONVIF_PORT = 80
+RECONNECT_DELAY = 5       # seconds between WebSocket reconnect attempts
+
+log = get_logger("protocols")
+HOT_LOG_RATE = 20         # outcome lines per second per message template, across all cameras
+RESULT_LOG_SAMPLE = 0.05  # fraction of "RESULT SENT" debug lines kept
 
 # **PARALLEL PROCESSING SETUP**
 MAX_CONCURRENT_COMMANDS = 20  # Configurable concurrency limit
 command_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_COMMANDS)
-result_queue = queue.Queue()
+# Large results are compressed, chunked or spooled (result_transport.py) and
+# interleaved with small messages so one big dump cannot stall the rest
+result_queue = OutboundQueue()
+
+# **STREAM CHECK PROCESS POOL**
+# RTSP/SQ checks decode video; they run in worker processes so they scale
+# with cores. Workers spend part of each check sleeping between frames,
+# hence more workers than cores.
+SQ_WORKERS = min(MAX_CONCURRENT_COMMANDS, (os.cpu_count() or 1) * 2)
+SQ_CHECK_TIMEOUT = 30  # seconds before a hung decoder's worker is recycled
+sq_pool = SQWorkerPool(workers=SQ_WORKERS, task_timeout=SQ_CHECK_TIMEOUT)
+
+# **ASYNC PROBE ENGINE**
+# One event loop shared by all worker threads, so e.g. SNMP polls to every
+# camera are pipelined over a single UDP socket.
+SNMP_POLL_TIMEOUT = 30
+HTTP_PROBE_TIMEOUT = 5
+async_loop = asyncio.new_event_loop()  # run by start_agent()
+snmp_client = SnmpClient(timeout=2.0, retries=1)
+http_probe = HttpProbe(timeout=HTTP_PROBE_TIMEOUT)
+
+def run_async(coro, timeout=None):
+    """Run a coroutine on the shared probe loop from a worker thread"""
+    future = asyncio.run_coroutine_threadsafe(coro, async_loop)
+    try:
+        return future.result(timeout)
+    except Exception:
+        future.cancel()
+        raise
+
+# **STREAMING PROGRESS**
+# Long-running protocols report partial output as command_progress messages
+# (same commandId) before the final command_result.
+STREAMING_PROTOCOLS = {"traceroute", "snmp"}
+PROGRESS_MIN_INTERVAL = 0.5  # seconds between progress messages per command
+STDBUF = shutil.which("stdbuf")
+
+class ProgressEmitter:
+    """Batch partial output into throttled command_progress messages"""
+
+    def __init__(self, command_id, camera_id, is_scheduled, scheduler_id, min_interval=PROGRESS_MIN_INTERVAL):
+        self.command_id = command_id
+        self.camera_id = camera_id
+        self.is_scheduled = is_scheduled
+        self.scheduler_id = scheduler_id
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.pending = []
+        self.seq = 0
+        self.last_sent = 0.0
+        self.timer = None
+
+    def __call__(self, partial):
+        with self.lock:
+            self.pending.append(partial)
+            wait = self.min_interval - (time.monotonic() - self.last_sent)
+            if wait <= 0:
+                self._flush_locked()
+            elif self.timer is None:
+                # Trailing flush so a slow next hop doesn't hold back what we have
+                self.timer = threading.Timer(wait, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self.timer = None
+        if not self.pending:
+            return
+        self.seq += 1
+        result_queue.put({
+            "type": "command_progress",
+            "commandId": self.command_id,
+            "cameraId": self.camera_id,
+            "seq": self.seq,
+            "partial": self.pending,
+            "isScheduled": self.is_scheduled,
+            "schedulerId": self.scheduler_id
+        })
+        self.pending = []
+        self.last_sent = time.monotonic()
 
 # ---------------- Utility ---------------- #
 def load_config():
@@ -46,147 +146,76 @@ def protocol_ping(ip):
         result = subprocess.run(["ping", "-c", "4", ip], capture_output=True, text=True, check=False)
         success = (result.returncode == 0)
         output = result.stdout.strip() if success else result.stderr.strip()
-        print(f"[{datetime.now()}] PING {ip} - {success}")
+        log.info("PING %s - %s", ip, success, extra=rate_limited(HOT_LOG_RATE))
         return success, output
     except Exception as e:
         return False, str(e)
 
-def protocol_traceroute(ip):
+def protocol_traceroute(ip, progress=None):
     try:
-        result = subprocess.run(["traceroute", ip], capture_output=True, text=True, check=False)
-        success = (result.returncode == 0)
-        output = result.stdout.strip() if success else result.stderr.strip()
-        print(f"[{datetime.now()}] TRACEROUTE {ip} - {success}")
+        # Line-buffer traceroute's stdout so each hop arrives as it is probed
+        cmd = ["traceroute", ip]
+        if STDBUF:
+            cmd = [STDBUF, "-oL"] + cmd
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+        lines = []
+        for line in proc.stdout:
+            line = line.rstrip()
+            lines.append(line)
+            if progress:
+                progress(line)
+        stderr = proc.stderr.read()
+        success = (proc.wait() == 0)
+        output = "\n".join(lines).strip() if success else stderr.strip()
+        log.info("TRACEROUTE %s - %s", ip, success, extra=rate_limited(HOT_LOG_RATE))
         return success, output
     except Exception as e:
         return False, str(e)
 
-def protocol_snmp(ip, community="public"):
+def protocol_snmp(ip, community="public", progress=None):
     try:
-        result = subprocess.run(["snmpwalk", "-v2c", "-c", community, ip], capture_output=True, text=True, check=False)
-        success = (result.returncode == 0)
-        output = result.stdout.strip() if success else result.stderr.strip()
-        print(f"[{datetime.now()}] SNMP {ip} - {success}")
-        return success, output
+        result = run_async(
+            snmp_client.poll(ip, community, on_progress=progress), timeout=SNMP_POLL_TIMEOUT
+        )
+        log.info("SNMP %s - True", ip, extra=rate_limited(HOT_LOG_RATE))
+        return True, result
     except Exception as e:
-        return False, str(e)
+        log.warning("SNMP %s - FAILED (%s)", ip, e, extra=rate_limited(HOT_LOG_RATE))
+        return False, str(e) or type(e).__name__
 
 def protocol_rtsp(rtsp_url):
-    try:
-        cap = cv2.VideoCapture(rtsp_url)
-        if not cap.isOpened():
-            return False, "Failed to open RTSP stream"
-        ret, _ = cap.read()
-        cap.release()
-        if ret:
-            print(f"[{datetime.now()}] RTSP {rtsp_url} - SUCCESS")
-            return True, "online"
-        else:
-            print(f"[{datetime.now()}] RTSP {rtsp_url} - FAILED")
-            return False, "offline"
-    except Exception as e:
-        return False, str(e)
+    success, result = sq_pool.run("rtsp", rtsp_url)
+    log.info("RTSP %s - %s", rtsp_url, "SUCCESS" if success else "FAILED", extra=rate_limited(HOT_LOG_RATE))
+    return success, result
 
 def protocol_http(ip, username=None, password=None):
     try:
-        url = f"http://{ip}"
-        if username and password:
-            password_mgr = urllib.request.HTTPPasswordMgrWithDefaultRealm()
-            password_mgr.add_password(None, url, username, password)
-            auth_handler = urllib.request.HTTPBasicAuthHandler(password_mgr)
-            opener = urllib.request.build_opener(auth_handler)
-            with opener.open(url, timeout=5) as response:
-                print(f"[{datetime.now()}] HTTP {ip} - SUCCESS ({response.getcode()})")
-                return True, f"HTTP status: {response.getcode()}"
+        success, result = run_async(
+            http_probe.probe(ip, username, password), timeout=HTTP_PROBE_TIMEOUT + 1
+        )
+        if success:
+            log.info("HTTP %s - SUCCESS (%s)", ip, result["status"], extra=rate_limited(HOT_LOG_RATE))
         else:
-            with urllib.request.urlopen(url, timeout=5) as response:
-                print(f"[{datetime.now()}] HTTP {ip} - SUCCESS ({response.getcode()})")
-                return True, f"HTTP status: {response.getcode()}"
+            log.warning("HTTP %s - FAILED (%s)", ip, result if isinstance(result, str) else result["status"], extra=rate_limited(HOT_LOG_RATE))
+        return success, result
     except Exception as e:
-        print(f"[{datetime.now()}] HTTP {ip} - FAILED ({str(e)})")
+        log.warning("HTTP %s - FAILED (%s)", ip, e, extra=rate_limited(HOT_LOG_RATE))
         return False, str(e)
 
 def protocol_sq_freeze(rtsp_url):
-    try:
-        cap = cv2.VideoCapture(rtsp_url)
-        if not cap.isOpened():
-            return False, "Failed to open RTSP stream"
-        ret1, frame1 = cap.read()
-        if not ret1:
-            cap.release()
-            return False, "Failed to read first frame"
-        time.sleep(1)
-        ret2, frame2 = cap.read()
-        if not ret2:
-            cap.release()
-            return False, "Failed to read second frame"
-        cap.release()
-        if frame1.shape != frame2.shape:
-            return False, "Frames have different dimensions"
-        diff = cv2.absdiff(frame1, frame2)
-        mean_diff = np.mean(diff)
-        threshold = 1.0
-        if mean_diff < threshold:
-            print(f"[{datetime.now()}] SQ_Freeze - DETECTED (frozen)")
-            return False, "frozen"
-        else:
-            print(f"[{datetime.now()}] SQ_Freeze - NORMAL")
-            return True, "normal"
-    except Exception as e:
-        return False, str(e)
+    success, result = sq_pool.run("SQ_Freeze", rtsp_url)
+    log.info("SQ_Freeze - %s", "NORMAL" if success else f"DETECTED ({result})", extra=rate_limited(HOT_LOG_RATE))
+    return success, result
 
 def protocol_sq_longfreeze(rtsp_url):
-    try:
-        cap = cv2.VideoCapture(rtsp_url)
-        if not cap.isOpened():
-            return False, "Failed to open RTSP stream"
-        ret1, frame1 = cap.read()
-        if not ret1:
-            cap.release()
-            return False, "Failed to read first frame"
-        time.sleep(5)
-        ret2, frame2 = cap.read()
-        if not ret2:
-            cap.release()
-            return False, "Failed to read second frame"
-        cap.release()
-        if frame1.shape != frame2.shape:
-            return False, "Frames have different dimensions"
-        diff = cv2.absdiff(frame1, frame2)
-        mean_diff = np.mean(diff)
-        threshold = 1.0
-        if mean_diff < threshold:
-            print(f"[{datetime.now()}] SQ_LongFreeze - DETECTED (long_frozen)")
-            return False, "long_frozen"
-        else:
-            print(f"[{datetime.now()}] SQ_LongFreeze - NORMAL")
-            return True, "normal"
-    except Exception as e:
-        return False, str(e)
+    success, result = sq_pool.run("SQ_LongFreeze", rtsp_url)
+    log.info("SQ_LongFreeze - %s", "NORMAL" if success else f"DETECTED ({result})", extra=rate_limited(HOT_LOG_RATE))
+    return success, result
 
 def protocol_sq_blind(rtsp_url):
-    try:
-        cap = cv2.VideoCapture(rtsp_url)
-        if not cap.isOpened():
-            return False, "Failed to open RTSP stream"
-        ret, frame = cap.read()
-        if not ret:
-            cap.release()
-            return False, "Failed to read frame"
-        cap.release()
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        mean_brightness = np.mean(gray)
-        std_dev = np.std(gray)
-        brightness_threshold = 30.0
-        variance_threshold = 10.0
-        if mean_brightness < brightness_threshold and std_dev < variance_threshold:
-            print(f"[{datetime.now()}] SQ_Blind - DETECTED (blinded)")
-            return False, "blinded"
-        else:
-            print(f"[{datetime.now()}] SQ_Blind - NORMAL")
-            return True, "normal"
-    except Exception as e:
-        return False, str(e)
+    success, result = sq_pool.run("SQ_Blind", rtsp_url)
+    log.info("SQ_Blind - %s", "NORMAL" if success else f"DETECTED ({result})", extra=rate_limited(HOT_LOG_RATE))
+    return success, result
 
 def protocol_onvif_get_device_info_and_rtsp(ip, username, password):
     try:
@@ -211,13 +240,13 @@ def protocol_onvif_get_device_info_and_rtsp(ip, username, password):
             'ProfileToken': profile.token
         }
         uri = media.GetStreamUri(stream_setup)
-        print(f"[{datetime.now()}] ONVIF {ip} - SUCCESS")
+        log.info("ONVIF %s - SUCCESS", ip)
         return True, {
             "device_info": device_info,
             "rtsp_url": uri.Uri
         }
     except Exception as e:
-        print(f"[{datetime.now()}] ONVIF {ip} - FAILED ({str(e)})")
+        log.warning("ONVIF %s - FAILED (%s)", ip, e)
         return False, str(e)
 
 # Map protocol names to functions
@@ -236,10 +265,16 @@ PROTOCOL_MAP = {
 # **PARALLEL PROTOCOL EXECUTION WRAPPER**
 def execute_protocol_parallel(protocol, target_ip, rtsp_link, username, password, camera_id, command_id, is_scheduled, scheduler_id):
     """Execute protocol and put result in queue for WebSocket sending"""
-    print(f"[{datetime.now()}] PARALLEL START: {protocol} for camera {camera_id} (command: {command_id})")
+    log.debug("PARALLEL START: %s for camera %s (command: %s)", protocol, camera_id, command_id)
    
+    progress = None
+    if protocol in STREAMING_PROTOCOLS:
+        progress = ProgressEmitter(command_id, camera_id, is_scheduled, scheduler_id)
+
     try:
-        success, result = execute_protocol_func(protocol, target_ip, rtsp_link, username, password, camera_id)
+        success, result = execute_protocol_func(protocol, target_ip, rtsp_link, username, password, camera_id, progress)
+        if progress:
+            progress.close()
        
         response = {
             "type": "command_result",
@@ -251,10 +286,12 @@ def execute_protocol_parallel(protocol, target_ip, rtsp_link, username, password
             "schedulerId": scheduler_id
         }
        
-        result_queue.put(response)
-        print(f"[{datetime.now()}] PARALLEL COMPLETE: {protocol} for camera {camera_id} - {'SUCCESS' if success else 'FAILED'}")
+        result_queue.put_result(response)
+        log.debug("PARALLEL COMPLETE: %s for camera %s - %s", protocol, camera_id, "SUCCESS" if success else "FAILED")
        
     except Exception as e:
+        if progress:
+            progress.close()
         error_response = {
             "type": "command_result",
             "commandId": command_id,
@@ -265,9 +302,9 @@ def execute_protocol_parallel(protocol, target_ip, rtsp_link, username, password
             "schedulerId": scheduler_id
         }
         result_queue.put(error_response)
-        print(f"[{datetime.now()}] PARALLEL ERROR: {protocol} for camera {camera_id} - {str(e)}")
+        log.error("PARALLEL ERROR: %s for camera %s - %s", protocol, camera_id, e)
 
-def execute_protocol_func(protocol, target_ip, rtsp_link, username, password, camera_id):
+def execute_protocol_func(protocol, target_ip, rtsp_link, username, password, camera_id, progress=None):
     func = PROTOCOL_MAP.get(protocol)
     if not func:
         return False, f"Unknown protocol {protocol}"
@@ -281,11 +318,13 @@ def execute_protocol_func(protocol, target_ip, rtsp_link, username, password, ca
                 netloc = f"{username}:{password}@{parsed.netloc}"
                 url = parsed._replace(netloc=netloc).geturl()
    
-    if protocol in ["ping", "traceroute"]:
+    if protocol == "ping":
         return func(target_ip)
+    elif protocol == "traceroute":
+        return func(target_ip, progress=progress)
     elif protocol == "snmp":
         community = password if password else "public"
-        return func(target_ip, community=community)
+        return func(target_ip, community=community, progress=progress)
     elif protocol in ["rtsp", "SQ_Freeze", "SQ_LongFreeze", "SQ_Blind"]:
         return func(url)
     elif protocol in ["http", "onvif_get_device_info_and_rtsp"]:
@@ -293,22 +332,81 @@ def execute_protocol_func(protocol, target_ip, rtsp_link, username, password, ca
     else:
         return func(camera_id)
 
+# **EDGE SCHEDULER**
+# Recurring checks defined once by the server and run locally with
+# per-camera jitter; they keep running while the WebSocket is down.
+scheduled_inflight = set()
+scheduled_lock = threading.Lock()
+
+def dispatch_scheduled(schedule, camera, run_at):
+    key = (schedule["schedulerId"], camera["cameraId"])
+    with scheduled_lock:
+        if key in scheduled_inflight:
+            log.warning("SCHEDULED SKIP: %s for camera %s still running", schedule["protocol"], camera["cameraId"], extra=rate_limited(HOT_LOG_RATE))
+            return
+        scheduled_inflight.add(key)
+
+    def _done(_):
+        with scheduled_lock:
+            scheduled_inflight.discard(key)
+
+    command_id = f"{schedule['schedulerId']}-{camera['cameraId']}-{int(run_at)}"
+    future = command_executor.submit(
+        execute_protocol_parallel,
+        schedule["protocol"], camera.get("targetIp"), camera.get("rtspLink"),
+        camera.get("username"), camera.get("password"), camera["cameraId"],
+        command_id, True, schedule["schedulerId"]
+    )
+    future.add_done_callback(_done)
+
+scheduler = EdgeScheduler(dispatch_scheduled)
+
+# Keeps CONFIG_FILE current (poll + facility_config_update pushes); load_config()
+# re-reads the file, and the pipelines follow it via stream_supervisor.py.
+# Created by start_agent().
+config_sync = None
+
 # **RESULT SENDER THREAD**
-def result_sender_thread(ws):
-    """Background thread to send results from queue to WebSocket"""
+def result_sender_thread():
+    """Background thread to send results from queue to WebSocket.
+
+    Results are held while disconnected and sent after the client
+    reconnects; OutboundQueue keeps that backlog bounded."""
+    pending = None
+    disconnected = False
     while True:
         try:
-            # Get result from queue (blocks until available)
-            result = result_queue.get(timeout=1)
-            if ws and ws.sock and ws.sock.connected:
-                ws.send(json.dumps(result))
-                print(f"[{datetime.now()}] RESULT SENT: {result['commandId']}")
+            if pending is None:
+                # Get result from queue (blocks until available)
+                result = result_queue.get(timeout=1)
+                try:
+                    pending = (result, json.dumps(result))
+                except (TypeError, ValueError) as e:
+                    log.error("Dropping unserializable result %s: %s", result.get("commandId"), e)
+                    result_queue.task_done()
+                    continue
+            ws = ws_instance
+            if not (ws and ws.sock and ws.sock.connected):
+                disconnected = True
+                time.sleep(1)
+                continue
+            if disconnected:
+                # The outbound queue bounds the outage backlog; report what it shed
+                disconnected = False
+                log.info("Reconnected: %d message(s) queued, %d scheduled result(s) superseded, %d dropped",
+                         result_queue.qsize(), result_queue.superseded, result_queue.dropped)
+            ws.send(pending[1])
+            log.debug("RESULT SENT: %s", pending[0].get("commandId"), extra=sampled(RESULT_LOG_SAMPLE))
+            pending = None
             result_queue.task_done()
         except queue.Empty:
             # No results to send, continue
             continue
         except Exception as e:
-            print(f"[{datetime.now()}] Error sending result: {e}")
+            log.error("Error sending result: %s", e, extra=rate_limited(1))
+            time.sleep(1)
+
+sender_thread = None
 
 # **ENHANCED WEBSOCKET CALLBACKS**
 ws_instance = None
@@ -324,17 +422,19 @@ def on_open(ws):
         "facilityId": device_info["facilityId"],
         "macAddress": device_info["macAddress"]
     }))
-    print(f"[{datetime.now()}] Connected & Registered: Edge Device {device_info['edgeDeviceId']} with {MAX_CONCURRENT_COMMANDS} parallel workers")
+    log.info("Connected & Registered: Edge Device %s with %s parallel workers", device_info["edgeDeviceId"], MAX_CONCURRENT_COMMANDS)
    
-    # **START RESULT SENDER THREAD**
-    sender_thread = threading.Thread(target=result_sender_thread, args=(ws,), daemon=True)
-    sender_thread.start()
+    # **START RESULT SENDER THREAD** (once; it follows ws_instance across reconnects)
+    global sender_thread
+    if sender_thread is None:
+        sender_thread = threading.Thread(target=result_sender_thread, daemon=True)
+        sender_thread.start()
 
 def on_message(ws, message):
     try:
         data = json.loads(message)
     except json.JSONDecodeError:
-        print(f"[{datetime.now()}] Invalid JSON received: {message}")
+        log.warning("Invalid JSON received: %s", message)
         return
 
     msg_type = data.get("type")
@@ -350,7 +450,7 @@ def on_message(ws, message):
         is_scheduled = data.get("isScheduled", False)
         scheduler_id = data.get("schedulerId", None)
 
-        print(f"[{datetime.now()}] PARALLEL DISPATCH: {protocol} for camera {camera_id}{ ' (scheduled)' if is_scheduled else ''}")
+        log.debug("PARALLEL DISPATCH: %s for camera %s%s", protocol, camera_id, " (scheduled)" if is_scheduled else "")
 
         # **SUBMIT TO THREAD POOL FOR PARALLEL EXECUTION**
         future = command_executor.submit(
@@ -359,57 +459,138 @@ def on_message(ws, message):
             command_id, is_scheduled, scheduler_id
         )
        
-        print(f"[{datetime.now()}] QUEUED: {protocol} for camera {camera_id} (active workers: {len(command_executor._threads)})")
+        log.debug("QUEUED: %s for camera %s (active workers: %s)", protocol, camera_id, len(command_executor._threads))
        
+    elif msg_type == "occupancy_query":
+        # Rollups written by the detection pipelines (metadata.py)
+        try:
+            buckets = query_devices(
+                data.get("deviceIds"),
+                resolution=data.get("resolution", "minute"),
+                since=data.get("since"),
+                until=data.get("until")
+            )
+            response = {"type": "occupancy_result", "requestId": data.get("requestId"), "success": True,
+                        "resolution": data.get("resolution", "minute"), "devices": buckets}
+        except Exception as e:
+            response = {"type": "occupancy_result", "requestId": data.get("requestId"), "success": False,
+                        "result": str(e)}
+        result_queue.put_result(response, "devices")
+        log.info("OCCUPANCY QUERY: %s for %s", data.get("resolution", "minute"), data.get("deviceIds") or "all devices")
+
+    elif msg_type == "schedule_upsert":
+        try:
+            schedule = scheduler.upsert(data.get("schedule"))
+            response = {"type": "schedule_ack", "schedulerId": schedule["schedulerId"], "success": True}
+            log.info("SCHEDULE SET: %s - %s every %ss for %d camera(s)", schedule["schedulerId"], schedule["protocol"], schedule["intervalSeconds"], len(schedule["cameras"]))
+        except (ScheduleError, TypeError, ValueError) as e:
+            schedule_id = data["schedule"].get("schedulerId") if isinstance(data.get("schedule"), dict) else None
+            response = {"type": "schedule_ack", "schedulerId": schedule_id, "success": False, "message": str(e)}
+            log.warning("SCHEDULE REJECTED: %s", e)
+        result_queue.put(response)
+
+    elif msg_type == "schedule_remove":
+        removed = scheduler.remove(data.get("schedulerId"))
+        result_queue.put({"type": "schedule_ack", "schedulerId": data.get("schedulerId"), "success": removed})
+        log.info("SCHEDULE REMOVED: %s - %s", data.get("schedulerId"), removed)
+
+    elif msg_type == "schedule_list":
+        result_queue.put({"type": "schedule_state", "schedules": scheduler.list()})
+
+    elif msg_type == "set_log_level":
+        # {"levels": {"protocols": "DEBUG", "pipeline": "WARNING", "edge": "INFO"}, "json": true}
+        try:
+            if data.get("levels"):
+                edge_log.publish_levels(data["levels"])
+            if "json" in data:
+                edge_log.set_json(bool(data["json"]))
+            response = {"type": "log_level_state", "success": True, "levels": edge_log.levels(),
+                        "dropped": edge_log.dropped()}
+        except (ValueError, TypeError, OSError) as e:
+            response = {"type": "log_level_state", "success": False, "message": str(e)}
+        result_queue.put(response)
+
+    elif msg_type == "facility_config_update":
+        # {"config": {...}} replaces the config; {"upsert": [devices], "remove": [ids]} patches it
+        try:
+            if "config" in data:
+                diff = config_sync.apply(data["config"])
+            else:
+                diff = config_sync.apply_patch(data.get("upsert"), data.get("remove"))
+            response = {"type": "facility_config_ack", "requestId": data.get("requestId"), "success": True, "diff": diff}
+        except (ValueError, TypeError, KeyError, OSError) as e:
+            response = {"type": "facility_config_ack", "requestId": data.get("requestId"), "success": False, "message": str(e)}
+            log.warning("CONFIG UPDATE REJECTED: %s", e)
+        result_queue.put(response)
+
+    elif msg_type == "fetch_spooled_result":
+        # Oversized results are parked locally; the server pulls them when it wants them
+        command_executor.submit(result_queue.put_spooled, data.get("spoolId"), data.get("requestId"))
+        log.info("SPOOL FETCH: %s", data.get("spoolId"))
+
     elif msg_type == "ping":
         ws.send(json.dumps({"type": "pong"}))
-        print(f"[{datetime.now()}] Pong sent")
+        log.debug("Pong sent")
        
     elif msg_type == "connection_established":
-        print(f"[{datetime.now()}] Server: Connection established - {data.get('message')}")
+        log.info("Server: Connection established - %s", data.get("message"))
        
     elif msg_type == "registration_success":
-        print(f"[{datetime.now()}] Server: {data.get('message')}")
+        log.info("Server: %s", data.get("message"))
        
     elif msg_type == "error":
-        print(f"[{datetime.now()}] Server error: {data.get('message')}")
+        log.error("Server error: %s", data.get("message"))
        
     else:
-        print(f"[{datetime.now()}] Unhandled message: {data}")
+        log.warning("Unhandled message: %s", data)
 
 def on_close(ws, close_status_code, close_msg):
-    print(f"[{datetime.now()}] WebSocket closed. Shutting down thread pool...")
-    command_executor.shutdown(wait=False)
-    print(f"[{datetime.now()}] Reconnecting in 5 seconds...")
-    time.sleep(5)
-    start_ws_client()
+    # The thread pool and scheduler keep running; results queue until reconnect
+    log.warning("WebSocket closed. Local schedules keep running.")
 
 def on_error(ws, error):
-    print(f"[{datetime.now()}] WebSocket error: {error}")
+    log.error("WebSocket error: %s", error)
 
 # **START CLIENT WITH PARALLEL PROCESSING**
 def start_ws_client():
-    device_info = load_device_info()
-    query_params = {
-        "facilityId": device_info["facilityId"],
-        "isEdgeDevice": "true",
-        "edgeDeviceId": device_info["edgeDeviceId"],
-        "macAddress": device_info["macAddress"]
-    }
-    ws_url = f"{WS_BASE_URL}?{urlencode(query_params)}"
-   
-    print(f"[{datetime.now()}] Starting WebSocket client with {MAX_CONCURRENT_COMMANDS} parallel workers...")
-   
-    ws = websocket.WebSocketApp(
-        ws_url,
-        on_open=on_open,
-        on_message=on_message,
-        on_close=on_close,
-        on_error=on_error
-    )
-    ws.run_forever()
+    log.info("Starting WebSocket client with %s parallel workers...", MAX_CONCURRENT_COMMANDS)
+    # Reconnect in a loop: run_forever() returns on close and on a failed
+    # connect alike, and recursing from on_close would exhaust the stack
+    while True:
+        device_info = load_device_info()
+        query_params = {
+            "facilityId": device_info["facilityId"],
+            "isEdgeDevice": "true",
+            "edgeDeviceId": device_info["edgeDeviceId"],
+            "macAddress": device_info["macAddress"]
+        }
+        ws_url = f"{WS_BASE_URL}?{urlencode(query_params)}"
+
+        ws = websocket.WebSocketApp(
+            ws_url,
+            on_open=on_open,
+            on_message=on_message,
+            on_close=on_close,
+            on_error=on_error
+        )
+        ws.run_forever()
+        log.info("Reconnecting in %s seconds...", RECONNECT_DELAY)
+        time.sleep(RECONNECT_DELAY)
+
+# **AGENT STARTUP**
+# SQ worker processes are spawned and re-import this file as __mp_main__, so
+# everything with side effects (threads, file reads) starts here, not at
+# import time.
+def start_agent():
+    global config_sync
+    threading.Thread(target=async_loop.run_forever, daemon=True).start()
+    config_sync = ConfigSync(CONFIG_FILE)
+    scheduler.load()
+    scheduler.start()
+    config_sync.start()
 
 if __name__ == "__main__":
     websocket.enableTrace(False)
-    print(f"[{datetime.now()}] Edge Device starting with parallel processing enabled...")
+    log.info("Edge Device starting with parallel processing enabled...")
+    start_agent()
     start_ws_client()
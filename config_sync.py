@@ -0,0 +1,210 @@
+# ===================================================
+# Facility Config Sync (conditional polling, push updates, per-device diff)
+# ===================================================
+
+import json
+import os
+import threading
+import time
+import requests
+from edge_log import get_logger, rate_limited
+
+CONFIG_FILE = "/home/metro/facility_config.json"
+# Backend endpoint returning the facility config for this edge device; it
+# should honour If-None-Match / If-Modified-Since. Empty disables polling
+# and only pushed updates (facility_config_update) are applied.
+CONFIG_URL = os.environ.get("FACILITY_CONFIG_URL", "")
+POLL_INTERVAL = 60      # seconds
+REQUEST_TIMEOUT = 10    # seconds
+SYNC_STATE_FILE = "/home/metro/store/config_sync.json"
+
+# Device fields whose change means the device's stream must be restarted
+DEVICE_FIELDS = ("rtsp_link", "enabledUseCases")
+
+log = get_logger("config")
+
+
+def load_config(path=CONFIG_FILE):
+    with open(path, "r") as f:
+        return json.load(f)
+
+def write_config(config, path=CONFIG_FILE):
+    """Replace the config file atomically so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def devices_by_id(config, use_case=None):
+    devices = {}
+    for device in ((config or {}).get("device") or {}).get("devices") or []:
+        if device.get("id") is None:
+            continue
+        if use_case and use_case not in (device.get("enabledUseCases") or []):
+            continue
+        devices[str(device["id"])] = device
+    return devices
+
+def diff_devices(old, new, use_case=None, fields=DEVICE_FIELDS):
+    """Device ids added, removed and changed between two configs.
+
+    With `use_case`, only devices that have it enabled are considered, so a
+    device that drops the use case shows up as removed.
+    """
+    before = devices_by_id(old, use_case)
+    after = devices_by_id(new, use_case)
+    changed = [
+        device_id for device_id in after
+        if device_id in before and any(before[device_id].get(k) != after[device_id].get(k) for k in fields)
+    ]
+    return {
+        "added": sorted(after.keys() - before.keys()),
+        "removed": sorted(before.keys() - after.keys()),
+        "changed": sorted(changed),
+    }
+
+def has_changes(diff):
+    return any(diff.values())
+
+def _validate(config):
+    if not isinstance(config, dict) or not isinstance(config.get("device"), dict):
+        raise ValueError("Config must contain a 'device' object")
+    if not isinstance(config["device"].get("devices", []), list):
+        raise ValueError("'device.devices' must be a list")
+
+
+class ConfigSync:
+    """Keep facility_config.json current without re-running registration.
+
+    Updates arrive either from polling CONFIG_URL with conditional headers
+    (a 304 costs one round trip and no parsing) or as pushes over the
+    diagnostics WebSocket, as a full config or an incremental device
+    upsert/remove. Each applied update is written atomically and every
+    listener receives (diff, config), so consumers restart only the
+    devices that were added, removed or changed. Pipelines in other
+    processes pick the new file up themselves (see stream_supervisor.py).
+    """
+
+    def __init__(self, path=CONFIG_FILE, url=CONFIG_URL, interval=POLL_INTERVAL, state_path=SYNC_STATE_FILE):
+        self.path = path
+        self.url = url
+        self.interval = interval
+        self.state_path = state_path
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.thread = None
+        try:
+            self.config = load_config(path)
+        except (OSError, ValueError):
+            self.config = None
+        # Saved validators only hold while the file they describe is present
+        self.etag, self.last_modified = self._load_state() if self.config is not None else (None, None)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    # ---------------- Applying updates ---------------- #
+    def apply(self, config, source="push"):
+        _validate(config)
+        with self.lock:
+            diff = self._apply_locked(config)
+        return self._notify(diff, config, source)
+
+    def apply_patch(self, upsert=None, remove=None, source="push"):
+        """Apply an incremental update: devices to add/replace by id, ids to remove."""
+        # Copy, merge and write under one hold of the lock so a concurrent
+        # apply() cannot land in between and be overwritten by a stale base
+        with self.lock:
+            if self.config is None:
+                raise ValueError("No base config to patch; send the full config")
+            config = json.loads(json.dumps(self.config))
+            devices = config["device"].setdefault("devices", [])
+            replaced = {str(d["id"]): d for d in upsert or [] if isinstance(d, dict) and d.get("id") is not None}
+            dropped = {str(device_id) for device_id in remove or []}
+            merged = []
+            for device in devices:
+                device_id = str(device.get("id"))
+                if device_id in dropped:
+                    continue
+                merged.append(replaced.pop(device_id, device))
+            merged.extend(replaced.values())
+            config["device"]["devices"] = merged
+            _validate(config)
+            diff = self._apply_locked(config)
+        return self._notify(diff, config, source)
+
+    def _apply_locked(self, config):
+        """Write `config` if it differs; returns the diff, or None when unchanged. Caller holds self.lock."""
+        if config == self.config:
+            return None
+        diff = diff_devices(self.config, config)
+        write_config(config, self.path)
+        self.config = config
+        return diff
+
+    def _notify(self, diff, config, source):
+        # Listeners run outside the lock so they may call back into apply()
+        if diff is None:
+            return diff_devices(config, config)
+        log.info("facility config updated (%s): +%d -%d ~%d device(s)",
+                 source, len(diff["added"]), len(diff["removed"]), len(diff["changed"]))
+        for listener in self.listeners:
+            try:
+                listener(diff, config)
+            except Exception as e:
+                log.error("config listener failed: %s", e)
+        return diff
+
+    # ---------------- Polling ---------------- #
+    def _params(self):
+        device = (self.config or {}).get("device") or {}
+        return {"edgeDeviceId": device.get("id"), "macAddress": device.get("macAddress")}
+
+    def poll_once(self):
+        """Fetch the config if it changed on the backend; returns the diff or None on 304."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        response = requests.get(self.url, params=self._params(), headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        diff = self.apply(response.json(), "poll")
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self._save_state()
+        return diff
+
+    def start(self):
+        if self.url and self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll_once()
+            except (requests.RequestException, ValueError, OSError) as e:
+                log.warning("config poll failed: %s", e, extra=rate_limited(1))
+            time.sleep(self.interval)
+
+    # ---------------- Validator persistence ---------------- #
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+            return state.get("etag"), state.get("lastModified")
+        except (OSError, ValueError):
+            return None, None
+
+    def _save_state(self):
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            with open(self.state_path, "w") as f:
+                json.dump({"etag": self.etag, "lastModified": self.last_modified}, f)
+        except OSError as e:
+            log.warning("failed to save %s: %s", self.state_path, e)
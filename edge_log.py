@@ -0,0 +1,214 @@
+# ===================================================
+# Shared Low-Overhead Logging (queued, rate-limited, runtime levels)
+# ===================================================
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+ROOT_LOGGER = "edge"
+LOG_LEVEL = os.environ.get("EDGE_LOG_LEVEL", "INFO")
+LOG_JSON = os.environ.get("EDGE_LOG_JSON", "0") == "1"
+LOG_QUEUE_SIZE = 10000
+# {"logger": "LEVEL"} overrides shared by every process on the box
+LEVELS_FILE = os.environ.get("EDGE_LOG_LEVELS_FILE", "/home/metro/store/log_levels.json")
+LEVELS_POLL_INTERVAL = 5  # seconds
+
+TEXT_FORMAT = "[%(asctime)s] %(levelname)s %(name)s: %(message)s"
+
+_lock = threading.Lock()
+_state = {}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class HotPathFilter(logging.Filter):
+    """Drop records early according to `sample` / `rate_limit` extras.
+
+    extra=sampled(0.01) keeps ~1% of records; extra=rate_limited(5) keeps at
+    most 5 records per second per message template and reports how many
+    were suppressed on the next one that gets through.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.windows = {}
+        self.lock = threading.Lock()  # records are filtered on the logging threads
+
+    def filter(self, record):
+        sample = getattr(record, "sample", None)
+        if sample is not None and random.random() >= sample:
+            return False
+        limit = getattr(record, "rate_limit", None)
+        if limit is None:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= 1.0:
+                suppressed = window[2] if window else 0
+                self.windows[key] = [now, 1, 0]
+            elif window[1] < limit:
+                window[1] += 1
+                return True
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.msg} (+{suppressed} suppressed)"
+        return True
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue without formatting or blocking; formatting happens on the writer thread."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.started = False
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if not self.started:
+            _start_threads()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def sampled(rate):
+    return {"sample": rate}
+
+def rate_limited(per_second):
+    return {"rate_limit": per_second}
+
+def fields(**values):
+    """Structured key/values, emitted as top-level keys in JSON mode."""
+    return {"fields": values}
+
+def _formatter(json_output):
+    return JsonFormatter() if json_output else logging.Formatter(TEXT_FORMAT)
+
+def setup():
+    """Install the queued handler on the 'edge' logger once per process.
+
+    Threads (writer, levels-file watcher) start with the first record, so
+    processes that import a module but never log (e.g. spawned workers
+    re-importing a main script) stay thread-free.
+    """
+    with _lock:
+        if _state:
+            return logging.getLogger(ROOT_LOGGER)
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(_formatter(LOG_JSON))
+        listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+
+        handler = _NonBlockingQueueHandler(log_queue)
+        handler.addFilter(HotPathFilter())
+        root = logging.getLogger(ROOT_LOGGER)
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL.upper())
+        root.propagate = False
+
+        _state.update(listener=listener, stream=stream, handler=handler, levels_mtime=None)
+    _read_levels_file()
+    return root
+
+def _start_threads():
+    with _lock:
+        handler = _state["handler"]
+        if handler.started:
+            return
+        _state["listener"].start()
+        atexit.register(_state["listener"].stop)
+        threading.Thread(target=_watch_levels_file, daemon=True).start()
+        handler.started = True
+
+def get_logger(name):
+    setup()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+# ---------------- Runtime control ---------------- #
+def set_level(level, logger=None):
+    """Change a level at runtime; logger is a name under 'edge' (None for all)."""
+    name = ROOT_LOGGER if not logger or logger == ROOT_LOGGER else f"{ROOT_LOGGER}.{logger}"
+    logging.getLogger(name).setLevel(level.upper() if isinstance(level, str) else level)
+
+def set_json(enabled):
+    setup()
+    _state["stream"].setFormatter(_formatter(enabled))
+
+def levels():
+    setup()
+    result = {ROOT_LOGGER: logging.getLevelName(logging.getLogger(ROOT_LOGGER).level)}
+    prefix = ROOT_LOGGER + "."
+    for name, logger in logging.Logger.manager.loggerDict.items():
+        if name.startswith(prefix) and isinstance(logger, logging.Logger) and logger.level:
+            result[name[len(prefix):]] = logging.getLevelName(logger.level)
+    return result
+
+def dropped():
+    setup()
+    return _state["handler"].dropped
+
+def apply_levels(overrides):
+    for name, level in overrides.items():
+        set_level(level, None if name == ROOT_LOGGER else name)
+
+def publish_levels(overrides, path=LEVELS_FILE):
+    """Apply overrides here and share them with other processes via LEVELS_FILE."""
+    apply_levels(overrides)
+    current = {}
+    try:
+        with open(path, "r") as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        pass
+    current.update(overrides)
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tmp_path, "w") as f:
+        json.dump(current, f)
+    os.replace(tmp_path, path)
+
+def _read_levels_file():
+    try:
+        mtime = os.path.getmtime(LEVELS_FILE)
+        if mtime != _state.get("levels_mtime"):
+            with open(LEVELS_FILE, "r") as f:
+                apply_levels(json.load(f))
+            _state["levels_mtime"] = mtime
+    except (OSError, ValueError):
+        pass
+
+def _watch_levels_file():
+    while True:
+        time.sleep(LEVELS_POLL_INTERVAL)
+        _read_levels_file()
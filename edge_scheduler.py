@@ -0,0 +1,187 @@
+# ===================================================
+# Edge-Local Recurring Diagnostics Scheduler
+# ===================================================
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import zlib
+from edge_log import get_logger
+
+SCHEDULE_FILE = "/home/metro/store/schedules.json"
+MIN_INTERVAL = 10  # seconds
+
+log = get_logger("scheduler")
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+def jitter_offset(scheduler_id, camera_id, window):
+    """Deterministic per-camera phase within the window, stable across restarts."""
+    digest = zlib.crc32(f"{scheduler_id}:{camera_id}".encode("utf-8"))
+    return (digest / 2 ** 32) * window
+
+def next_run(now, interval, offset):
+    """First time after `now` that sits at `offset` seconds into an interval slot."""
+    run_at = now - (now % interval) + offset
+    if run_at <= now:
+        run_at += interval
+    return run_at
+
+
+class EdgeScheduler:
+    """Run recurring protocol checks locally instead of per-execution pushes.
+
+    A schedule is defined once as {schedulerId, protocol, intervalSeconds,
+    cameras: [{cameraId, targetIp, rtspLink, username, password}, ...]}
+    and optionally jitterSeconds (defaults to the whole interval). Each
+    camera runs at a fixed, hash-derived offset within every interval, so
+    a schedule's load is spread evenly instead of firing in one burst.
+    Definitions are persisted, so schedules resume after an agent restart
+    and keep running while the server connection is down.
+    """
+
+    def __init__(self, dispatch, path=SCHEDULE_FILE):
+        self.dispatch = dispatch
+        self.path = path
+        self.schedules = {}
+        self.generations = {}
+        self.heap = []
+        self.sequence = itertools.count()
+        self.cond = threading.Condition()
+        self.thread = None
+
+    # ---------------- Definitions ---------------- #
+    @staticmethod
+    def _validate(definition):
+        if not isinstance(definition, dict):
+            raise ScheduleError("Schedule must be an object")
+        for key in ("schedulerId", "protocol", "intervalSeconds", "cameras"):
+            if definition.get(key) in (None, ""):
+                raise ScheduleError(f"Schedule is missing '{key}'")
+        interval = float(definition["intervalSeconds"])
+        if interval < MIN_INTERVAL:
+            raise ScheduleError(f"intervalSeconds must be at least {MIN_INTERVAL}")
+        jitter = float(definition.get("jitterSeconds", interval))
+        if not 0 <= jitter <= interval:
+            raise ScheduleError("jitterSeconds must be between 0 and intervalSeconds")
+        cameras = definition["cameras"]
+        if not isinstance(cameras, list) or any(
+            not isinstance(c, dict) or c.get("cameraId") is None for c in cameras
+        ):
+            raise ScheduleError("cameras must be a list of objects with a cameraId")
+        return dict(definition, intervalSeconds=interval, jitterSeconds=jitter)
+
+    def upsert(self, definition, persist=True):
+        schedule = self._validate(definition)
+        scheduler_id = schedule["schedulerId"]
+        now = time.time()
+        with self.cond:
+            self.schedules[scheduler_id] = schedule
+            generation = self.generations.get(scheduler_id, 0) + 1
+            self.generations[scheduler_id] = generation
+            for camera in schedule["cameras"]:
+                offset = jitter_offset(scheduler_id, camera["cameraId"], schedule["jitterSeconds"])
+                run_at = next_run(now, schedule["intervalSeconds"], offset)
+                heapq.heappush(self.heap, (run_at, next(self.sequence), scheduler_id, generation, camera["cameraId"]))
+            self.cond.notify()
+        if persist:
+            self.save()
+        return schedule
+
+    def remove(self, scheduler_id):
+        with self.cond:
+            removed = self.schedules.pop(scheduler_id, None) is not None
+            # Stale heap entries are discarded lazily by generation
+            self.generations[scheduler_id] = self.generations.get(scheduler_id, 0) + 1
+            self.cond.notify()
+        if removed:
+            self.save()
+        return removed
+
+    def list(self):
+        with self.cond:
+            return [
+                {
+                    **{k: v for k, v in s.items() if k != "cameras"},
+                    "cameraIds": [c["cameraId"] for c in s["cameras"]],
+                }
+                for s in self.schedules.values()
+            ]
+
+    # ---------------- Persistence ---------------- #
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                definitions = json.load(f)
+        except (OSError, ValueError) as e:
+            log.error("failed to load %s: %s", self.path, e)
+            return
+        for definition in definitions:
+            try:
+                self.upsert(definition, persist=False)
+            except (ScheduleError, TypeError, ValueError) as e:
+                log.warning("skipping stored schedule: %s", e)
+        log.info("restored %d schedule(s)", len(self.schedules))
+
+    def save(self):
+        with self.cond:
+            definitions = list(self.schedules.values())
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Definitions carry camera credentials
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(definitions, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.error("failed to save %s: %s", self.path, e)
+
+    # ---------------- Run loop ---------------- #
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _next_due(self):
+        """Pop the next due (schedule, camera, run_at); blocks until one is due."""
+        with self.cond:
+            while True:
+                if not self.heap:
+                    self.cond.wait()
+                    continue
+                run_at, _, scheduler_id, generation, camera_id = self.heap[0]
+                if generation != self.generations.get(scheduler_id):
+                    heapq.heappop(self.heap)
+                    continue
+                now = time.time()
+                if run_at > now:
+                    self.cond.wait(run_at - now)
+                    continue
+                heapq.heappop(self.heap)
+                schedule = self.schedules[scheduler_id]
+                interval = schedule["intervalSeconds"]
+                # After a stall, skip missed slots rather than firing a burst
+                following = run_at + interval
+                if following <= now:
+                    following += ((now - following) // interval + 1) * interval
+                heapq.heappush(self.heap, (following, next(self.sequence), scheduler_id, generation, camera_id))
+                camera = next((c for c in schedule["cameras"] if c["cameraId"] == camera_id), None)
+                if camera is not None:
+                    return schedule, camera, run_at
+
+    def _run(self):
+        while True:
+            schedule, camera, run_at = self._next_due()
+            try:
+                self.dispatch(schedule, camera, run_at)
+            except Exception as e:
+                log.error("dispatch failed for %s/%s: %s", schedule["schedulerId"], camera["cameraId"], e)
@@ -0,0 +1,85 @@
+# ===================================================
+# Per-Label Occupancy Heatmap Accumulator
+# ===================================================
+
+import time
+import numpy as np
+
+
+class HeatmapAccumulator:
+    """Accumulate detection centres on the GRID_SIZE x GRID_SIZE map grid.
+
+    One float32 grid per label is updated with a vectorized scatter-add per
+    frame. Every `interval` seconds emit() returns a downsampled, sparse
+    snapshot; afterwards the grids are either reset ("window" mode) or
+    exponentially decayed with the given half-life ("decay" mode).
+    """
+
+    def __init__(self, grid_size, interval=60.0, mode="decay", half_life=600.0, downsample=5):
+        if mode not in ("decay", "window"):
+            raise ValueError(f"Unknown heatmap mode {mode}")
+        if grid_size % downsample:
+            downsample = 1
+        self.grid_size = grid_size
+        self.interval = interval
+        self.mode = mode
+        self.half_life = half_life
+        self.downsample = downsample
+        self.grids = {}
+        self.frames = 0
+        self.window_start = time.time()
+
+    def add(self, label, xs, ys, weight=1.0):
+        """Add one frame's centres; `weight` counts frames this one stands in for."""
+        grid = self.grids.get(label)
+        if grid is None:
+            grid = self.grids[label] = np.zeros((self.grid_size, self.grid_size), dtype=np.float32)
+        last = self.grid_size - 1
+        xs = np.clip(np.asarray(xs, dtype=np.intp), 0, last)
+        ys = np.clip(np.asarray(ys, dtype=np.intp), 0, last)
+        np.add.at(grid.ravel(), ys * self.grid_size + xs, float(weight))
+
+    def tick(self, frames=1):
+        self.frames += frames
+
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        return now - self.window_start >= self.interval
+
+    def emit(self, now=None):
+        """Return a sparse snapshot of every non-empty grid and start a new window."""
+        now = time.time() if now is None else now
+        factor = self.downsample
+        cells = self.grid_size // factor
+        heatmaps = {}
+        for label, grid in self.grids.items():
+            reduced = grid.reshape(cells, factor, cells, factor).sum(axis=(1, 3))
+            rows, cols = np.nonzero(reduced >= 0.01)
+            if not len(rows):
+                continue
+            heatmaps[label] = {
+                "rows": rows.tolist(),
+                "cols": cols.tolist(),
+                "values": np.round(reduced[rows, cols], 2).tolist(),
+                "total": round(float(reduced.sum()), 2),
+            }
+        payload = {
+            "windowStart": self.window_start,
+            "windowEnd": now,
+            "frames": self.frames,
+            "mode": self.mode,
+            "shape": [cells, cells],
+            "cellSize": factor,
+            "heatmaps": heatmaps,
+        }
+
+        if self.mode == "window":
+            for grid in self.grids.values():
+                grid.fill(0)
+        else:
+            decay = 0.5 ** ((now - self.window_start) / self.half_life)
+            for grid in self.grids.values():
+                grid *= decay
+        self.window_start = now
+        self.frames = 0
+        return payload
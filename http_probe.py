@@ -0,0 +1,338 @@
+# ===================================================
+# Async HTTP Probe Engine (keep-alive pools, Basic/Digest auth)
+# ===================================================
+
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import time
+
+HTTP_PORT = 80
+USER_AGENT = "edge-diagnostics/1.0"
+MAX_BODY_BYTES = 1024 * 1024
+MAX_IDLE_PER_HOST = 4
+IDLE_TIMEOUT = 30.0
+
+# Status codes from embedded web servers that reject HEAD outright
+HEAD_UNSUPPORTED = (400, 405, 501)
+
+_AUTH_PARAM_RE = re.compile(r'([\w-]+)\s*=\s*(?:"((?:[^"\\]|\\.)*)"|([^\s,]*))')
+
+
+class HttpProbeError(Exception):
+    pass
+
+
+class _Response:
+    def __init__(self, version, status, reason, headers):
+        self.version = version
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+
+    def header(self, name, default=None):
+        values = self.headers.get(name.lower())
+        return values[-1] if values else default
+
+    @property
+    def keep_alive(self):
+        connection = (self.header("connection") or "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+
+    @property
+    def usable(self):
+        return (
+            not self.reader.at_eof()
+            and not self.writer.is_closing()
+            and time.monotonic() - self.last_used < IDLE_TIMEOUT
+        )
+
+    def close(self):
+        self.writer.close()
+
+# ---------------- Auth ---------------- #
+def parse_challenges(values):
+    """Parse WWW-Authenticate header values into {scheme: {param: value}}."""
+    challenges = {}
+    for value in values:
+        scheme, _, rest = value.strip().partition(" ")
+        params = {}
+        for match in _AUTH_PARAM_RE.finditer(rest):
+            quoted, bare = match.group(2), match.group(3)
+            params[match.group(1).lower()] = quoted if quoted is not None else bare
+        challenges[scheme.lower()] = params
+    return challenges
+
+def basic_authorization(username, password):
+    token = base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("ascii")
+    return f"Basic {token}"
+
+
+class DigestState:
+    """RFC 7616 Digest credentials for one host, reused across requests."""
+
+    _HASHES = {"MD5": hashlib.md5, "SHA-256": hashlib.sha256}
+
+    def __init__(self, challenge):
+        self.realm = challenge.get("realm", "")
+        self.nonce = challenge.get("nonce", "")
+        self.opaque = challenge.get("opaque")
+        self.algorithm = challenge.get("algorithm", "MD5")
+        qops = [q.strip() for q in challenge.get("qop", "").split(",") if q.strip()]
+        self.qop = "auth" if "auth" in qops else None
+        self.nonce_count = 0
+        base = self.algorithm.upper().replace("-SESS", "")
+        if base not in self._HASHES:
+            raise HttpProbeError(f"Unsupported digest algorithm {self.algorithm}")
+        self._hash = self._HASHES[base]
+        self._sess = self.algorithm.upper().endswith("-SESS")
+
+    def _h(self, data):
+        return self._hash(data.encode("utf-8")).hexdigest()
+
+    def authorization(self, method, uri, username, password):
+        self.nonce_count += 1
+        nc = f"{self.nonce_count:08x}"
+        cnonce = os.urandom(8).hex()
+        ha1 = self._h(f"{username}:{self.realm}:{password}")
+        if self._sess:
+            ha1 = self._h(f"{ha1}:{self.nonce}:{cnonce}")
+        ha2 = self._h(f"{method}:{uri}")
+        if self.qop:
+            response = self._h(f"{ha1}:{self.nonce}:{nc}:{cnonce}:{self.qop}:{ha2}")
+        else:
+            response = self._h(f"{ha1}:{self.nonce}:{ha2}")
+        parts = [
+            f'username="{username}"', f'realm="{self.realm}"', f'nonce="{self.nonce}"',
+            f'uri="{uri}"', f"algorithm={self.algorithm}", f'response="{response}"',
+        ]
+        if self.opaque is not None:
+            parts.append(f'opaque="{self.opaque}"')
+        if self.qop:
+            parts.extend([f"qop={self.qop}", f"nc={nc}", f'cnonce="{cnonce}"'])
+        return "Digest " + ", ".join(parts)
+
+# ---------------- Probe Engine ---------------- #
+def split_host_port(target, default_port=HTTP_PORT):
+    host, sep, port = target.rpartition(":")
+    if sep and port.isdigit() and ":" not in host:
+        return host, int(port)
+    return target, default_port
+
+
+class HttpProbe:
+    """HTTP reachability prober with per-host keep-alive connection pools.
+
+    Probes try HEAD first and fall back to GET for servers that reject it;
+    such hosts are remembered and probed with GET from then on.
+    401 challenges are answered with Digest or Basic credentials, and the
+    negotiated scheme is cached per host so later probes authenticate
+    preemptively.
+    """
+
+    def __init__(self, timeout=5.0, max_idle_per_host=MAX_IDLE_PER_HOST):
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.pools = {}
+        self.auth_cache = {}
+        self.head_rejected = set()
+
+    # ----- connection pool ----- #
+    async def _acquire(self, host, port):
+        idle = self.pools.get((host, port), [])
+        while idle:
+            conn = idle.pop()
+            if conn.usable:
+                return conn, True
+            conn.close()
+        reader, writer = await asyncio.open_connection(host, port)
+        return _Connection(reader, writer), False
+
+    def _release(self, host, port, conn, keep_alive):
+        idle = self.pools.setdefault((host, port), [])
+        if keep_alive and len(idle) < self.max_idle_per_host:
+            conn.last_used = time.monotonic()
+            idle.append(conn)
+        else:
+            conn.close()
+
+    def close(self):
+        for idle in self.pools.values():
+            for conn in idle:
+                conn.close()
+        self.pools.clear()
+
+    # ----- wire protocol ----- #
+    async def _read_response(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before response")
+        ttfb = time.monotonic()
+        parts = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            raise HttpProbeError(f"Malformed status line: {status_line[:80]!r}")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers.setdefault(name.strip().lower(), []).append(value.strip())
+        reason = parts[2] if len(parts) > 2 else ""
+        return _Response(parts[0], int(parts[1]), reason, headers), ttfb
+
+    async def _drain_body(self, reader, response, method):
+        """Consume the body so the connection can be reused; False if it cannot be."""
+        if method == "HEAD" or response.status in (204, 304) or 100 <= response.status < 200:
+            return True
+        if "chunked" in (response.header("transfer-encoding") or "").lower():
+            total = 0
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return True
+                total += size
+                if total > MAX_BODY_BYTES:
+                    return False
+                await reader.readexactly(size + 2)
+        length = response.header("content-length")
+        if length is not None:
+            length = int(length)
+            if length > MAX_BODY_BYTES:
+                return False
+            await reader.readexactly(length)
+            return True
+        return False
+
+    async def _exchange(self, host, port, method, path, authorization):
+        """Send one request over a pooled connection; retries once on a stale keep-alive socket."""
+        for attempt in range(2):
+            conn_start = time.monotonic()
+            conn, reused = await self._acquire(host, port)
+            connected = time.monotonic()
+            request = (
+                f"{method} {path} HTTP/1.1\r\n"
+                f"Host: {host if port == HTTP_PORT else f'{host}:{port}'}\r\n"
+                f"User-Agent: {USER_AGENT}\r\n"
+                "Accept: */*\r\n"
+                "Connection: keep-alive\r\n"
+            )
+            if authorization:
+                request += f"Authorization: {authorization}\r\n"
+            sent = time.monotonic()
+            try:
+                conn.writer.write((request + "\r\n").encode("latin-1"))
+                await conn.writer.drain()
+                response, ttfb = await self._read_response(conn.reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                # Includes cancellation by the probe timeout: never leak the socket
+                conn.close()
+                raise
+            try:
+                keep_alive = await self._drain_body(conn.reader, response, method) and response.keep_alive
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                keep_alive = False
+            except BaseException:
+                conn.close()
+                raise
+            self._release(host, port, conn, keep_alive)
+            timings = {
+                "connect": 0.0 if reused else (connected - conn_start) * 1000,
+                "ttfb": (ttfb - sent) * 1000,
+            }
+            return response, timings, reused
+
+    def _authorization(self, host, port, method, path, username, password):
+        cached = self.auth_cache.get((host, port))
+        if not cached or not username:
+            return None
+        if cached == "basic":
+            return basic_authorization(username, password)
+        return cached.authorization(method, path, username, password)
+
+    def _negotiate(self, host, port, response, username):
+        """Pick Digest or Basic from a 401 challenge; returns True if a retry is worthwhile."""
+        if not username:
+            return False
+        challenges = parse_challenges(response.headers.get("www-authenticate", []))
+        previous = self.auth_cache.get((host, port))
+        if "digest" in challenges:
+            try:
+                state = DigestState(challenges["digest"])
+            except HttpProbeError:
+                state = None
+            if state is not None:
+                self.auth_cache[(host, port)] = state
+                # Same nonce rejected again means the credentials are wrong
+                return not isinstance(previous, DigestState) or previous.nonce != state.nonce
+        if "basic" in challenges:
+            self.auth_cache[(host, port)] = "basic"
+            return previous != "basic"
+        return False
+
+    async def _probe(self, host, port, path, username, password):
+        start = time.monotonic()
+        method = "GET" if (host, port) in self.head_rejected else "HEAD"
+        # Connect time is summed over every exchange (HEAD fallback, 401 retry)
+        timings = {"connect": 0.0}
+        reused = True
+        for _ in range(4):
+            authorization = self._authorization(host, port, method, path, username, password)
+            response, exchange, exchange_reused = await self._exchange(host, port, method, path, authorization)
+            timings["connect"] += exchange["connect"]
+            timings["ttfb"] = exchange["ttfb"]
+            reused = reused and exchange_reused
+            if response.status == 401 and self._negotiate(host, port, response, username):
+                continue
+            if method == "HEAD" and response.status in HEAD_UNSUPPORTED:
+                self.head_rejected.add((host, port))
+                method = "GET"
+                continue
+            break
+        cached = self.auth_cache.get((host, port)) if username else None
+        timings["total"] = (time.monotonic() - start) * 1000
+        return {
+            "status": response.status,
+            "reason": response.reason,
+            "method": method,
+            "auth": None if cached is None else ("basic" if cached == "basic" else "digest"),
+            "server": response.header("server"),
+            "reusedConnection": reused,
+            "timings": {k: round(v, 2) for k, v in timings.items()},
+        }
+
+    async def probe(self, target, username=None, password=None, path="/"):
+        """Probe http://target; returns (success, result_dict)."""
+        host, port = split_host_port(target)
+        try:
+            result = await asyncio.wait_for(
+                self._probe(host, port, path, username, password), self.timeout
+            )
+        except asyncio.TimeoutError:
+            return False, f"Timed out after {self.timeout}s"
+        except (OSError, HttpProbeError, asyncio.IncompleteReadError, ValueError) as e:
+            return False, str(e) or type(e).__name__
+        return result["status"] < 400, result
+
+    async def probe_many(self, targets):
+        """Probe many hosts at once; targets is [(target, username, password), ...]."""
+        results = await asyncio.gather(*(self.probe(*t) for t in targets))
+        return {t[0]: r for t, r in zip(targets, results)}
@@ -50,8 +50,7 @@ if [ -z "$FACILITY_ID" ]; then
 fi
 
 if [ ${#RTSP_STREAMS[@]} -eq 0 ]; then
-    echo "[ERROR] No RTSP streams found for use case \"$USE_CASE\". Exiting."
-    exit 1
+    echo "[WARN] No RTSP streams found for use case \"$USE_CASE\" yet; waiting for config updates."
 fi
 
 echo "[INFO] Using facilityId=$FACILITY_ID"
@@ -64,32 +63,32 @@ PROCESS_HEIGHT=640
 # Use CPU for gvadetect
 DEVICE="CPU"
 
+# Motion gating: idle (static) streams only run inference on every
+# IDLE_INFERENCE_INTERVAL-th frame. Set MOTION_GATE=0 to disable.
+export MOTION_GATE="${MOTION_GATE:-1}"
+export IDLE_INFERENCE_INTERVAL="${IDLE_INFERENCE_INTERVAL:-10}"
+GATE_ELEMENT=""
+if [ "$MOTION_GATE" = "1" ]; then
+    GATE_ELEMENT="gvapython module=/home/metro/metadata.py class=MotionGate ! "
+    # Tells WebSocketDetector not to gate (again) on its own
+    export MOTION_GATE_UPSTREAM=1
+fi
+
 # ----------------------------
-# Build lightweight pipeline per stream
+# Per-stream pipeline template (@RTSP_LINK@ / @DEVICE_ID@ filled per device)
 # ----------------------------
-PIPELINE_BASE="rtspsrc latency=100 protocols=tcp"
-
-# Watchdog wrapper
-while true; do
-    echo "[INFO] Starting lightweight detection pipeline..."
-    
-    # Build pipelines for each stream
-    for i in "${!RTSP_STREAMS[@]}"; do
-        STREAM_PIPELINE="\
-rtspsrc location=${RTSP_STREAMS[$i]} latency=100 protocols=tcp ! \
+STREAM_TEMPLATE="\
+rtspsrc location=@RTSP_LINK@ latency=100 protocols=tcp ! \
 rtph264depay ! avdec_h264 ! \
 queue max-size-buffers=0 max-size-time=100000000 leaky=downstream ! \
 videoconvert ! videoscale ! video/x-raw,width=$PROCESS_WIDTH,height=$PROCESS_HEIGHT,format=NV12 ! \
-gvadetect model=$MODEL_XML model_proc=$MODEL_PROC device=$DEVICE threshold=0.2 nireq=4 batch-size=1 model-instance-id=live pre-process-backend=opencv ! \
+${GATE_ELEMENT}gvadetect model=$MODEL_XML model_proc=$MODEL_PROC device=$DEVICE threshold=0.2 nireq=4 batch-size=1 model-instance-id=live pre-process-backend=opencv ! \
 gvatrack tracking-type=zero-term-imageless ! \
 gvapython module=/home/metro/metadata.py class=WebSocketDetector"
 
-        # Run each stream in background
-        gst-launch-1.0 -e $STREAM_PIPELINE &
-    done
-
-    # Wait for all pipelines to exit
-    wait
-    echo "[WARN] One or more pipelines stopped. Restarting in 5 seconds..."
-    sleep 5
-done
+# ----------------------------
+# Supervisor: one pipeline per device, restarted individually on crash.
+# Config changes (config_sync.py) start/stop only the affected streams.
+# ----------------------------
+echo "[INFO] Starting lightweight detection pipelines under the stream supervisor..."
+exec python3 /home/metro/stream_supervisor.py "$USE_CASE" "$STREAM_TEMPLATE"
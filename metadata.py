@@ -3,13 +3,23 @@
 # ===================================================
 
 import json
+import logging
 import os
+import sys
 import time
 import threading
 import websocket
 import queue
 
-DEBUG = False
+# gvapython loads this file by path; make sibling modules importable
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from occupancy_store import OccupancyStore
+from heatmap import HeatmapAccumulator
+from motion_gate import ActivityGate, sample_luma
+from edge_log import get_logger, rate_limited, sampled
+
+# Verbosity is set at runtime (EDGE_LOG_LEVEL or the shared levels file)
+log = get_logger("pipeline")
 
 # Constants
 PROCESSING_WIDTH = 640
@@ -17,6 +27,27 @@ PROCESSING_HEIGHT = 640
 GRID_SIZE = 300
 WS_URL = "wss://visionanalyticsws.prod.squirrelvision.ai/edge"
 METADATA_PATH = "/home/metro/facility_config.json"
+# Set per process by stream_supervisor.py; otherwise streams map by index
+STREAM_DEVICE_ID = os.environ.get("STREAM_DEVICE_ID")
+
+# Heatmap accumulation on the GRID_SIZE grid
+HEATMAP_INTERVAL = 60       # seconds between heatmap messages
+HEATMAP_MODE = "decay"      # "decay" or "window" (reset after each message)
+HEATMAP_HALF_LIFE = 600     # seconds, decay mode only
+HEATMAP_DOWNSAMPLE = 5      # 300x300 grid -> 60x60 cells
+
+# Motion gating of idle scenes (MOTION_GATE=0 disables). The launchers put
+# a MotionGate element before gvadetect and set MOTION_GATE_UPSTREAM=1; the
+# detector then post-processes every frame that reaches it, counting each
+# one once per frame the gate dropped before it so dwell time stays in
+# source frames, and gates on its own only when there is no upstream gate.
+MOTION_GATE = os.environ.get("MOTION_GATE", "1") == "1"
+MOTION_GATE_UPSTREAM = os.environ.get("MOTION_GATE_UPSTREAM", "0") == "1"
+MOTION_THRESHOLD = 0.002    # fraction of sampled pixels changed counted as motion
+MOTION_IDLE_AFTER = 10      # seconds without motion before a stream is idle
+MOTION_SAMPLE_STEP = 8      # 640x640 -> 80x80 luma samples
+IDLE_INFERENCE_INTERVAL = int(os.environ.get("IDLE_INFERENCE_INTERVAL", 10))
+GATE_MESSAGE_KEY = "motionGateDropped"
 
 class StreamIDCounter:
     _instance = None
@@ -34,19 +65,75 @@ class StreamIDCounter:
             self._counter += 1
         return current_id
 
+def _frame_luma(frame):
+    with frame.data() as mat:
+        return sample_luma(mat, frame.video_info().height, MOTION_SAMPLE_STEP)
+
+def _gate_weight(frame):
+    """Frames a passed frame stands for: itself plus those MotionGate dropped before it."""
+    for message in frame.messages():
+        try:
+            return 1 + int(json.loads(message)[GATE_MESSAGE_KEY])
+        except (ValueError, TypeError, KeyError):
+            continue
+    return 1
+
+class MotionGate:
+    """Placed before gvadetect: while a stream is idle only every
+    IDLE_INFERENCE_INTERVAL-th frame is passed on, the rest are dropped.
+
+    A passed frame carries the number of frames dropped since the previous
+    one as a JSON message, so the detector can weight dwell time by it."""
+
+    def __init__(self, idle_interval=IDLE_INFERENCE_INTERVAL):
+        self.idle_interval = max(1, int(idle_interval))
+        self.activity = ActivityGate(MOTION_THRESHOLD, MOTION_IDLE_AFTER)
+        self.idle_frames = 0
+        self.dropped = 0
+
+    def process_frame(self, frame):
+        try:
+            active = self.activity.update(_frame_luma(frame))
+        except Exception:
+            active = None  # unscored: pass it on without touching the idle count
+        if active:
+            self.idle_frames = 0
+        elif active is not None:
+            self.idle_frames += 1
+            if self.idle_frames % self.idle_interval:
+                self.dropped += 1
+                return False
+        if self.dropped:
+            frame.add_message(json.dumps({GATE_MESSAGE_KEY: self.dropped}))
+            self.dropped = 0
+        return True
+
 class WebSocketDetector:
     def __init__(self):
         self.stream_id = StreamIDCounter().get_next_id()
         self.device_id, self.rtsp_url = self._get_device_metadata(self.stream_id)
 
         # Print mapping info
-        print(f"[MAPPING] Stream {self.stream_id} -> deviceId: {self.device_id} -> RTSP: {self.rtsp_url}")
+        log.info("[MAPPING] Stream %s -> deviceId: %s -> RTSP: %s", self.stream_id, self.device_id, self.rtsp_url)
 
         self.ws_lock = threading.Lock()
         self.ws = None
         self.stop_processing = False
         self.message_queue = queue.Queue(maxsize=100)
         self.last_sent_detections = {}
+        self.occupancy = self._open_occupancy_store()
+        self.heatmap = HeatmapAccumulator(
+            GRID_SIZE,
+            interval=HEATMAP_INTERVAL,
+            mode=HEATMAP_MODE,
+            half_life=HEATMAP_HALF_LIFE,
+            downsample=HEATMAP_DOWNSAMPLE
+        )
+        # With an upstream MotionGate, idle frames that get through carry fresh
+        # (reduced-rate) inference and must update last_frame_detections
+        gate_here = MOTION_GATE and not MOTION_GATE_UPSTREAM
+        self.activity = ActivityGate(MOTION_THRESHOLD, MOTION_IDLE_AFTER) if gate_here else None
+        self.last_frame_detections = {}
 
         self._start_websocket_thread()
         self._start_message_processor()
@@ -59,12 +146,22 @@ class WebSocketDetector:
                 dev for dev in data.get("device", {}).get("devices", [])
                 if dev.get("rtsp_link")
             ]
-            device = flat_devices[stream_index]
+            if STREAM_DEVICE_ID is not None:
+                device = next(dev for dev in flat_devices if str(dev.get("id")) == STREAM_DEVICE_ID)
+            else:
+                device = flat_devices[stream_index]
             return device.get("id"), device.get("rtsp_link")
         except Exception as e:
-            print(f"[ERROR] Failed to get device metadata for stream {stream_index}: {e}")
+            log.error("Failed to get device metadata for stream %s: %s", stream_index, e)
             return f"unknown_stream_{stream_index}", "N/A"
 
+    def _open_occupancy_store(self):
+        try:
+            return OccupancyStore(self.device_id)
+        except Exception as e:
+            log.error("Stream %s - Failed to open occupancy store: %s", self.stream_id, e)
+            return None
+
     def _start_websocket_thread(self):
         self.ws_thread = threading.Thread(target=self._manage_websocket, daemon=True)
         self.ws_thread.start()
@@ -86,17 +183,14 @@ class WebSocketDetector:
         while not self.stop_processing:
             try:
                 attempt += 1
-                if DEBUG:
-                    print(f"[INFO] Stream {self.stream_id} - Attempting WebSocket connection (attempt {attempt})")
+                log.debug("Stream %s - Attempting WebSocket connection (attempt %s)", self.stream_id, attempt)
                 with self.ws_lock:
                     self.ws = websocket.create_connection(WS_URL, timeout=10)
                     self.ws.settimeout(10)
-                    if DEBUG:
-                        print(f"[INFO] Stream {self.stream_id} - Connected to WebSocket: {WS_URL}")
+                    log.debug("Stream %s - Connected to WebSocket: %s", self.stream_id, WS_URL)
                 break
             except Exception as e:
-                if DEBUG:
-                    print(f"[ERROR] Stream {self.stream_id} - WebSocket connection failed: {str(e)}")
+                log.debug("Stream %s - WebSocket connection failed: %s", self.stream_id, e)
                 time.sleep(min(2 ** (attempt // 2), 10))
 
     def _send_heartbeat(self):
@@ -104,11 +198,9 @@ class WebSocketDetector:
             try:
                 with self.ws_lock:
                     self.ws.send(json.dumps({"event": "heartbeat"}))
-                if DEBUG:
-                    print(f"[DEBUG] Stream {self.stream_id} - Sent heartbeat")
+                log.debug("Stream %s - Sent heartbeat", self.stream_id)
             except Exception as e:
-                if DEBUG:
-                    print(f"[ERROR] Stream {self.stream_id} - Heartbeat failed: {str(e)}")
+                log.debug("Stream %s - Heartbeat failed: %s", self.stream_id, e)
                 with self.ws_lock:
                     self.ws = None
 
@@ -125,24 +217,69 @@ class WebSocketDetector:
         if not self.ws or not self.ws.connected:
             self._connect_websocket()
             if not self.ws or not self.ws.connected:
-                if DEBUG:
-                    print(f"[ERROR] Stream {self.stream_id} - WebSocket not connected, dropping message")
+                log.debug("Stream %s - WebSocket not connected, dropping message", self.stream_id, extra=rate_limited(1))
                 return
         try:
             with self.ws_lock:
                 self.ws.send(json.dumps(message))
-            if DEBUG:
-                print(f"[DEBUG] Stream {self.stream_id} - Sent data: {json.dumps(message)}")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Stream %s - Sent data: %s", self.stream_id, json.dumps(message), extra=sampled(0.1))
         except Exception as e:
-            if DEBUG:
-                print(f"[ERROR] Stream {self.stream_id} - Failed to send data: {str(e)}")
+            log.debug("Stream %s - Failed to send data: %s", self.stream_id, e)
             with self.ws_lock:
                 self.ws = None
             self._connect_websocket()
 
+    def _queue_message(self, message):
+        try:
+            self.message_queue.put_nowait(message)
+        except queue.Full:
+            log.debug("Stream %s - Message queue full, dropping message", self.stream_id, extra=rate_limited(1))
+
+    def _is_idle(self, frame):
+        if not self.activity:
+            return False
+        try:
+            return not self.activity.update(_frame_luma(frame))
+        except Exception as e:
+            log.debug("Stream %s - Motion scoring failed: %s", self.stream_id, e, extra=rate_limited(1))
+            return False
+
+    def _frame_weight(self, frame):
+        if not MOTION_GATE_UPSTREAM:
+            return 1
+        try:
+            return _gate_weight(frame)
+        except Exception as e:
+            log.debug("Stream %s - Cannot read gate message: %s", self.stream_id, e, extra=rate_limited(1))
+            return 1
+
+    def _record_frame(self, class_detections, weight=1):
+        # weight > 1 when an upstream MotionGate dropped frames before this one
+        people_count = len(class_detections.get("person", []))
+        vehicle_count = len(class_detections.get("vehicle", []))
+        if self.occupancy:
+            self.occupancy.record(people_count, vehicle_count, weight=weight)
+
+        for label, points in class_detections.items():
+            self.heatmap.add(label, [p["x"] for p in points], [p["y"] for p in points], weight)
+        self.heatmap.tick(weight)
+        if self.heatmap.due():
+            self._queue_message({"event": "heatmap", "deviceId": self.device_id, **self.heatmap.emit()})
+        return people_count, vehicle_count
+
     def process_frame(self, frame):
+        # Static scene (no upstream gate): detections can't have changed, so
+        # skip ROI post-processing and emission but keep the time series and
+        # heatmap dwell ticking with the last known detections.
+        if self._is_idle(frame):
+            self._record_frame(self.last_frame_detections)
+            log.debug("[IDLE] Stream %s - motion score %.4f", self.stream_id, self.activity.score, extra=sampled(0.01))
+            return True
+
         rois = list(frame.regions())
         class_detections = {}
+        debug = log.isEnabledFor(logging.DEBUG)
 
         for roi in rois:
             x, y, w, h = roi.rect()
@@ -168,13 +305,13 @@ class WebSocketDetector:
                 class_detections[label] = []
             class_detections[label].append({"x": int(grid_x), "y": int(grid_y)})
 
-            if DEBUG:
-                print(f"[Detect] Stream {self.stream_id} - {label} at ({x}, {y}, {w}, {h})")
+            if debug:
+                log.debug("[Detect] Stream %s - %s at (%s, %s, %s, %s)", self.stream_id, label, x, y, w, h, extra=sampled(0.01))
 
-        if class_detections:
-            people_count = len(class_detections.get("person", []))
-            vehicle_count = len(class_detections.get("vehicle", []))
+        people_count, vehicle_count = self._record_frame(class_detections, self._frame_weight(frame))
+        self.last_frame_detections = class_detections
 
+        if class_detections:
             message = {
                 "deviceId": self.device_id,
                 "detections": class_detections,
@@ -185,19 +322,16 @@ class WebSocketDetector:
             # Only send if detections changed
             if class_detections != self.last_sent_detections:
                 self.last_sent_detections = json.loads(json.dumps(class_detections)) 
-                try:
-                    self.message_queue.put_nowait(message)
-                except queue.Full:
-                    if DEBUG:
-                        print(f"[WARNING] Stream {self.stream_id} - Message queue full, dropping message")
-            else:
-                if DEBUG:
-                    print(f"[SKIP] Stream {self.stream_id} - No change in detections")
+                self._queue_message(message)
+            elif debug:
+                log.debug("[SKIP] Stream %s - No change in detections", self.stream_id, extra=sampled(0.01))
 
         return True
 
     def __del__(self):
         self.stop_processing = True
+        if self.occupancy:
+            self.occupancy.close()
         if self.ws:
             with self.ws_lock:
                 self.ws.close()
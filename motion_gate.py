@@ -0,0 +1,50 @@
+# ===================================================
+# Per-Stream Activity Gate (downscaled frame-difference motion score)
+# ===================================================
+
+import time
+import numpy as np
+
+
+def sample_luma(mat, height, step):
+    """Subsample the luma plane of a mapped frame (NV12/I420 planar or packed BGR/BGRx)."""
+    if mat.ndim == 2:
+        luma = mat[:height:step, ::step]
+    else:
+        luma = mat[:height:step, ::step, 1]
+    return luma.astype(np.float32)
+
+
+class ActivityGate:
+    """Track whether a stream's scene is changing.
+
+    The motion score is the fraction of subsampled luma pixels that differ
+    from a slowly adapting background by more than `pixel_delta`; using a
+    fraction instead of the mean difference keeps one small moving object
+    from being averaged away. A stream turns idle once no frame has scored
+    above `threshold` for `idle_after` seconds, and becomes active again on
+    the first frame that does.
+    """
+
+    def __init__(self, threshold=0.002, idle_after=10.0, pixel_delta=20.0, adapt_rate=0.1):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.idle_after = idle_after
+        self.adapt_rate = adapt_rate
+        self.background = None
+        self.last_motion = 0.0
+        self.score = 0.0
+
+    def update(self, luma, now=None):
+        """Feed one subsampled frame; returns True while the stream is active."""
+        now = time.monotonic() if now is None else now
+        if self.background is None or self.background.shape != luma.shape:
+            self.background = luma
+            self.last_motion = now
+            return True
+        delta = luma - self.background
+        self.score = float(np.count_nonzero(np.abs(delta) > self.pixel_delta)) / delta.size
+        self.background += self.adapt_rate * delta
+        if self.score >= self.threshold:
+            self.last_motion = now
+        return now - self.last_motion < self.idle_after
@@ -0,0 +1,239 @@
+# ===================================================
+# Edge Occupancy Time-Series Store (memory-mapped ring + rollups)
+# ===================================================
+
+import os
+import re
+import time
+import numpy as np
+
+STORE_DIR = "/home/metro/store/occupancy"
+SERIES = ("people", "vehicle")
+RAW_CAPACITY = 8192  # most recent per-frame samples
+FLUSH_INTERVAL = 60  # seconds between msync of dirty pages
+
+# resolution -> (bucket width in seconds, number of buckets kept)
+RESOLUTIONS = {
+    "second": (1, 3600),      # 1 hour
+    "minute": (60, 1440),     # 1 day
+    "hour": (3600, 24 * 30),  # 30 days
+}
+
+MAGIC = b"OCCSTORE"
+VERSION = 2
+HEADER_SIZE = 256
+
+# device_id keeps the unsanitized id (empty if it does not fit) for listings
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"), ("version", "<u4"), ("raw_capacity", "<u4"), ("raw_head", "<u8"),
+    ("device_id", "S224"),
+])
+RAW_DTYPE = np.dtype([("ts", "<f8")] + [(s, "<u4") for s in SERIES])
+BUCKET_DTYPE = np.dtype(
+    [("start", "<f8"), ("samples", "<u4")]
+    + [(f"{s}_{field}", dtype) for s in SERIES
+       for field, dtype in (("min", "<u4"), ("max", "<u4"), ("sum", "<f8"))]
+)
+
+
+def _layout():
+    offset = HEADER_SIZE
+    raw = (offset, RAW_CAPACITY)
+    offset += RAW_CAPACITY * RAW_DTYPE.itemsize
+    buckets = {}
+    for name, (_, capacity) in RESOLUTIONS.items():
+        buckets[name] = (offset, capacity)
+        offset += capacity * BUCKET_DTYPE.itemsize
+    return raw, buckets, offset
+
+def store_path(device_id, store_dir=STORE_DIR):
+    return os.path.join(store_dir, re.sub(r"[^\w.-]", "_", str(device_id)) + ".occ")
+
+def _check_header(header, path):
+    if header["magic"][0] != MAGIC:
+        raise ValueError(f"{path} is not an occupancy store")
+    if header["version"][0] != VERSION:
+        raise ValueError(f"{path} has store version {header['version'][0]}, expected {VERSION}")
+
+def _stored_device_id(path):
+    """Device id a store file was written for, falling back to its file name."""
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) != 1:
+        raise ValueError(f"{path} is not an occupancy store")
+    _check_header(header, path)
+    device_id = header["device_id"][0].decode("utf-8", "replace")
+    return device_id or os.path.basename(path)[:-len(".occ")]
+
+
+class OccupancyStore:
+    """Per-device occupancy history backed by one memory-mapped file.
+
+    Every frame's counts go into a fixed-size raw ring. Counts are folded
+    into second/minute/hour min/max/avg buckets each time a second
+    completes, so the file survives pipeline restarts and can be read by
+    other processes (e.g. the diagnostics agent) without coordination.
+    """
+
+    def __init__(self, device_id, store_dir=STORE_DIR, readonly=False):
+        self.device_id = device_id
+        self.path = store_path(device_id, store_dir)
+        self.readonly = readonly
+        (raw_offset, raw_capacity), bucket_layout, total_size = _layout()
+
+        if readonly:
+            self.mm = np.memmap(self.path, dtype=np.uint8, mode="r")
+            if len(self.mm) < HEADER_DTYPE.itemsize:
+                raise ValueError(f"{self.path} is not an occupancy store")
+        else:
+            os.makedirs(store_dir, exist_ok=True)
+            fresh = not os.path.exists(self.path) or os.path.getsize(self.path) != total_size
+            self.mm = np.memmap(self.path, dtype=np.uint8, mode="w+" if fresh else "r+", shape=(total_size,))
+
+        self.header = self.mm[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+        if not readonly and (
+            self.header["magic"][0] != MAGIC or self.header["version"][0] != VERSION
+        ):
+            self.mm[:] = 0
+            self.header["magic"] = MAGIC
+            self.header["version"] = VERSION
+            self.header["raw_capacity"] = raw_capacity
+        elif readonly:
+            _check_header(self.header, self.path)
+        if not readonly:
+            encoded = str(device_id).encode("utf-8")
+            self.header["device_id"] = encoded if len(encoded) <= HEADER_DTYPE["device_id"].itemsize else b""
+
+        self.raw = self.mm[raw_offset:raw_offset + raw_capacity * RAW_DTYPE.itemsize].view(RAW_DTYPE)
+        self.buckets = {
+            name: self.mm[offset:offset + capacity * BUCKET_DTYPE.itemsize].view(BUCKET_DTYPE)
+            for name, (offset, capacity) in bucket_layout.items()
+        }
+
+        self._second = None
+        self._acc = None
+        self._last_flush = time.monotonic()
+
+    # ---------------- Writing ---------------- #
+    def record(self, people_count, vehicle_count, ts=None, weight=1):
+        """Record one frame's counts; `weight` frames are folded into the rollups."""
+        ts = time.time() if ts is None else ts
+        counts = (people_count, vehicle_count)
+
+        head = int(self.header["raw_head"][0])
+        self.raw[head % len(self.raw)] = (ts,) + counts
+        self.header["raw_head"] = head + 1
+
+        second = int(ts)
+        if second != self._second:
+            self._fold_second()
+            self._second = second
+            self._acc = [0, [c for c in counts], [c for c in counts], [0] * len(SERIES)]
+        samples, mins, maxs, sums = self._acc
+        self._acc[0] = samples + weight
+        for i, value in enumerate(counts):
+            if value < mins[i]:
+                mins[i] = value
+            if value > maxs[i]:
+                maxs[i] = value
+            sums[i] += value * weight
+
+        if time.monotonic() - self._last_flush > FLUSH_INTERVAL:
+            self.mm.flush()
+            self._last_flush = time.monotonic()
+
+    def _fold_second(self):
+        """Merge the completed second into every rollup resolution."""
+        if self._second is None:
+            return
+        samples, mins, maxs, sums = self._acc
+        for name, (width, capacity) in RESOLUTIONS.items():
+            start = float(self._second - self._second % width)
+            bucket = self.buckets[name][int(start // width) % capacity]
+            if bucket["start"] != start or bucket["samples"] == 0:
+                bucket["start"] = start
+                bucket["samples"] = 0
+                for i, s in enumerate(SERIES):
+                    bucket[f"{s}_min"] = mins[i]
+                    bucket[f"{s}_max"] = maxs[i]
+                    bucket[f"{s}_sum"] = 0.0
+            bucket["samples"] += samples
+            for i, s in enumerate(SERIES):
+                bucket[f"{s}_min"] = min(bucket[f"{s}_min"], mins[i])
+                bucket[f"{s}_max"] = max(bucket[f"{s}_max"], maxs[i])
+                bucket[f"{s}_sum"] += sums[i]
+        self._second = None
+
+    def flush(self):
+        if not self.readonly:
+            self._fold_second()
+            self.mm.flush()
+
+    def close(self):
+        self.flush()
+        # Dropping every view releases the mapping
+        self.header = self.raw = self.buckets = self.mm = None
+
+    # ---------------- Reading ---------------- #
+    def query(self, resolution="minute", since=None, until=None):
+        """Return completed buckets in [since, until] as a list of dicts, oldest first."""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution}")
+        buckets = np.array(self.buckets[resolution])
+        mask = buckets["samples"] > 0
+        if since is not None:
+            mask &= buckets["start"] >= since
+        if until is not None:
+            mask &= buckets["start"] <= until
+        selected = buckets[mask]
+        selected = selected[np.argsort(selected["start"])]
+        return [
+            {
+                "start": float(b["start"]),
+                "samples": int(b["samples"]),
+                **{
+                    s: {
+                        "min": int(b[f"{s}_min"]),
+                        "max": int(b[f"{s}_max"]),
+                        "avg": round(float(b[f"{s}_sum"]) / int(b["samples"]), 3),
+                    }
+                    for s in SERIES
+                },
+            }
+            for b in selected
+        ]
+
+    def recent(self, limit=100):
+        """Return the newest raw samples, oldest first."""
+        head = int(self.header["raw_head"][0])
+        count = min(limit, head, len(self.raw))
+        indexes = np.arange(head - count, head) % len(self.raw)
+        return [
+            {"ts": float(r["ts"]), **{s: int(r[s]) for s in SERIES}}
+            for r in self.raw[indexes]
+        ]
+
+
+def query_devices(device_ids=None, resolution="minute", since=None, until=None, store_dir=STORE_DIR):
+    """Read rollups for the given devices (all stored devices if None) without locking the writers."""
+    if device_ids is None:
+        if not os.path.isdir(store_dir):
+            return {}
+        device_ids = []
+        for name in sorted(os.listdir(store_dir)):
+            if not name.endswith(".occ"):
+                continue
+            try:
+                device_ids.append(_stored_device_id(os.path.join(store_dir, name)))
+            except (OSError, ValueError):
+                continue  # stale store from an older version, or being created
+    results = {}
+    for device_id in device_ids:
+        if not os.path.exists(store_path(device_id, store_dir)):
+            results[str(device_id)] = []
+            continue
+        store = OccupancyStore(device_id, store_dir, readonly=True)
+        try:
+            results[str(device_id)] = store.query(resolution, since, until)
+        finally:
+            store.close()
+    return results
@@ -0,0 +1,250 @@
+# ===================================================
+# Outbound Transport for Large Results (compress, chunk, spool)
+# ===================================================
+
+import base64
+import collections
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import zlib
+from edge_log import get_logger, rate_limited
+
+COMPRESS_THRESHOLD = 16 * 1024         # JSON bytes above which a payload is compressed
+CHUNK_SIZE = 32 * 1024                 # base64 characters per chunk message
+SPOOL_THRESHOLD = 4 * 1024 * 1024      # compressed bytes above which a payload is parked
+SPOOL_DIR = "/home/metro/store/spool"
+SPOOL_TTL = 3600                       # seconds a parked payload stays retrievable
+SMALL_BURST = 8                        # small messages sent per chunk when both are waiting
+# Backlog bounds while the server is unreachable (scheduled runs keep going)
+MAX_QUEUED_MESSAGES = 5000             # oldest small messages are dropped beyond this
+MAX_PENDING_TRANSFERS = 16             # further large results are spooled instead of queued
+ENCODING = "zlib+base64"
+
+log = get_logger("transport")
+
+
+def _chunk_base(transfer_id, message, **ids):
+    """Fields identifying a transfer's chunks; transferId is unique per transfer."""
+    base = {"type": "command_result_chunk", "transferId": transfer_id,
+            "commandId": message.get("commandId"), "cameraId": message.get("cameraId"), **ids}
+    if message.get("requestId") is not None:
+        base["requestId"] = message["requestId"]
+    return base
+
+def _chunk_messages(base, encoded, final):
+    """Yield chunk messages for an encoded payload, then the final message."""
+    total = (len(encoded) + CHUNK_SIZE - 1) // CHUNK_SIZE
+    for seq in range(total):
+        yield dict(base, seq=seq + 1, total=total, data=encoded[seq * CHUNK_SIZE:(seq + 1) * CHUNK_SIZE])
+    yield dict(final, chunks=total)
+
+
+class ResultSpool:
+    """Park oversized compressed payloads on disk until the server fetches them."""
+
+    def __init__(self, spool_dir=SPOOL_DIR, ttl=SPOOL_TTL):
+        self.spool_dir = spool_dir
+        self.ttl = ttl
+
+    def _paths(self, spool_id):
+        base = os.path.join(self.spool_dir, spool_id)
+        return base + ".z", base + ".json"
+
+    def park(self, compressed, meta):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.expire()
+        spool_id = uuid.uuid4().hex
+        data_path, meta_path = self._paths(spool_id)
+        with open(data_path, "wb") as f:
+            f.write(compressed)
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+        return spool_id
+
+    def load(self, spool_id):
+        if not isinstance(spool_id, str) or not spool_id or not all(c in "0123456789abcdef" for c in spool_id):
+            raise KeyError(spool_id)
+        data_path, meta_path = self._paths(spool_id)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            with open(data_path, "rb") as f:
+                return f.read(), meta
+        except FileNotFoundError:
+            raise KeyError(spool_id)
+
+    def expire(self):
+        cutoff = time.time() - self.ttl
+        try:
+            names = os.listdir(self.spool_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.spool_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class OutboundQueue:
+    """Outbound message queue with a small-message lane and a bulk lane.
+
+    Small messages (ping results, progress, acks) are never stuck behind a
+    large transfer: chunked transfers are sent one chunk at a time,
+    round-robin across transfers, with up to SMALL_BURST small messages
+    between chunks. get()/task_done() mirror queue.Queue for the sender.
+
+    The backlog is bounded for long disconnects: a queued scheduled result
+    is replaced by a newer one for the same (schedulerId, cameraId), the
+    oldest messages are dropped past MAX_QUEUED_MESSAGES, and large
+    results are spooled once MAX_PENDING_TRANSFERS are waiting.
+    """
+
+    def __init__(self, spool=None):
+        self.small = collections.deque()  # [message] holders, replaced in place when superseded
+        self.latest = {}                  # (schedulerId, cameraId) -> queued holder
+        self.streams = collections.deque()
+        self.cond = threading.Condition()
+        self.small_sent = 0
+        self.spool = spool or ResultSpool()
+        self.superseded = 0
+        self.dropped = 0
+
+    @staticmethod
+    def _coalesce_key(message):
+        if message.get("type") == "command_result" and message.get("isScheduled") and message.get("schedulerId"):
+            return message["schedulerId"], message.get("cameraId")
+        return None
+
+    def put(self, message):
+        key = self._coalesce_key(message)
+        with self.cond:
+            holder = self.latest.get(key) if key else None
+            if holder is not None:
+                holder[0] = message
+                self.superseded += 1
+                log.debug("superseded queued result for %s/%s", *key, extra=rate_limited(1))
+                return
+            holder = [message]
+            self.small.append(holder)
+            if key:
+                self.latest[key] = holder
+            if len(self.small) > MAX_QUEUED_MESSAGES:
+                self._forget(self.small.popleft())
+                self.dropped += 1
+                log.warning("outbound backlog full; %d message(s) dropped so far", self.dropped, extra=rate_limited(1))
+            self.cond.notify()
+
+    def _forget(self, holder):
+        key = self._coalesce_key(holder[0])
+        if key and self.latest.get(key) is holder:
+            del self.latest[key]
+        return holder[0]
+
+    def put_stream(self, messages):
+        with self.cond:
+            self.streams.append(iter(messages))
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while True:
+                if self.small and (not self.streams or self.small_sent < SMALL_BURST):
+                    self.small_sent += 1
+                    return self._forget(self.small.popleft())
+                while self.streams:
+                    stream = self.streams.popleft()
+                    message = next(stream, None)
+                    if message is not None:
+                        self.streams.append(stream)
+                        self.small_sent = 0
+                        return message
+                if self.small:
+                    continue
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self.cond.wait(remaining)
+
+    def task_done(self):
+        pass
+
+    def qsize(self):
+        with self.cond:
+            return len(self.small) + len(self.streams)
+
+    # ---------------- Large payloads ---------------- #
+    def put_result(self, message, key="result"):
+        """Queue a message whose `key` may be large: compress, chunk or spool it as needed."""
+        try:
+            raw = json.dumps(message.get(key)).encode("utf-8")
+        except (TypeError, ValueError):
+            self.put(message)
+            return
+        if len(raw) < COMPRESS_THRESHOLD:
+            self.put(message)
+            return
+
+        compressed = zlib.compress(raw, 6)
+        meta = {
+            "transferId": uuid.uuid4().hex,
+            "encoding": ENCODING,
+            "field": key,
+            "size": len(raw),
+            "compressedSize": len(compressed),
+            "sha256": hashlib.sha256(raw).hexdigest(),
+        }
+        final = dict(message, **{key: None}, transfer=meta)
+
+        with self.cond:
+            backlogged = len(self.streams) >= MAX_PENDING_TRANSFERS
+        if len(compressed) > SPOOL_THRESHOLD or backlogged:
+            try:
+                spool_id = self.spool.park(compressed, dict(meta, commandId=message.get("commandId"),
+                                                             cameraId=message.get("cameraId"),
+                                                             requestId=message.get("requestId")))
+                final["transfer"] = dict(meta, spoolId=spool_id)
+                log.info("SPOOLED %s: %d bytes -> %s", message.get("commandId"), len(raw), spool_id)
+                self.put(final)
+                return
+            except OSError as e:
+                log.error("Spool failed for %s, sending chunked: %s", message.get("commandId"), e)
+
+        encoded = base64.b64encode(compressed).decode("ascii")
+        if len(encoded) <= CHUNK_SIZE:
+            final[key + "Compressed"] = encoded
+            self.put(final)
+            return
+        self.put_stream(_chunk_messages(_chunk_base(meta["transferId"], message), encoded, final))
+
+    def put_spooled(self, spool_id, request_id=None):
+        """Stream a parked payload to the server in response to fetch_spooled_result."""
+        # Runs on the command executor with nobody reading the future: every
+        # failure must become a reply
+        try:
+            compressed, meta = self.spool.load(spool_id)
+        except KeyError:
+            error = "Unknown or expired spoolId"
+        except (OSError, ValueError) as e:
+            error = f"Failed to read spooled result: {e}"
+        else:
+            error = None
+        if error:
+            self.put({"type": "spooled_result", "spoolId": spool_id, "requestId": request_id,
+                      "success": False, "message": error})
+            return
+        encoded = base64.b64encode(compressed).decode("ascii")
+        # Every fetch is its own transfer, so repeated fetches never mix chunks
+        transfer = dict(meta, transferId=uuid.uuid4().hex)
+        ids = {"commandId": meta.get("commandId"), "cameraId": meta.get("cameraId"), "requestId": request_id}
+        final = {"type": "spooled_result", "spoolId": spool_id, "requestId": request_id,
+                 "success": True, "transfer": transfer}
+        self.put_stream(_chunk_messages(_chunk_base(transfer["transferId"], ids, spoolId=spool_id), encoded, final))
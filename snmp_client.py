@@ -0,0 +1,445 @@
+# ===================================================
+# Async SNMP v2c Client (GET / GETBULK over one UDP socket)
+# ===================================================
+
+import asyncio
+import socket
+from edge_log import get_logger, rate_limited
+
+SNMP_PORT = 161
+SNMP_VERSION_2C = 1
+
+log = get_logger("snmp")
+
+# OIDs collected by a diagnostics poll (name -> OID)
+SCALAR_OIDS = {
+    "sysDescr": "1.3.6.1.2.1.1.1.0",
+    "sysUpTime": "1.3.6.1.2.1.1.3.0",
+    "sysName": "1.3.6.1.2.1.1.5.0",
+    "ifNumber": "1.3.6.1.2.1.2.1.0",
+}
+
+# ifTable columns walked with GETBULK (name -> column OID)
+INTERFACE_COLUMNS = {
+    "descr": "1.3.6.1.2.1.2.2.1.2",
+    "operStatus": "1.3.6.1.2.1.2.2.1.8",
+    "inOctets": "1.3.6.1.2.1.2.2.1.10",
+    "inDiscards": "1.3.6.1.2.1.2.2.1.13",
+    "inErrors": "1.3.6.1.2.1.2.2.1.14",
+    "outOctets": "1.3.6.1.2.1.2.2.1.16",
+    "outDiscards": "1.3.6.1.2.1.2.2.1.19",
+    "outErrors": "1.3.6.1.2.1.2.2.1.20",
+}
+
+IF_OPER_STATUS = {
+    1: "up", 2: "down", 3: "testing", 4: "unknown",
+    5: "dormant", 6: "notPresent", 7: "lowerLayerDown",
+}
+
+# BER tags
+TAG_INTEGER = 0x02
+TAG_OCTET_STRING = 0x04
+TAG_NULL = 0x05
+TAG_OID = 0x06
+TAG_SEQUENCE = 0x30
+TAG_IP_ADDRESS = 0x40
+TAG_COUNTER32 = 0x41
+TAG_GAUGE32 = 0x42
+TAG_TIMETICKS = 0x43
+TAG_OPAQUE = 0x44
+TAG_COUNTER64 = 0x46
+TAG_NO_SUCH_OBJECT = 0x80
+TAG_NO_SUCH_INSTANCE = 0x81
+TAG_END_OF_MIB_VIEW = 0x82
+
+PDU_GET = 0xA0
+PDU_GET_NEXT = 0xA1
+PDU_RESPONSE = 0xA2
+PDU_GET_BULK = 0xA5
+
+ERROR_STATUS = {
+    0: "noError", 1: "tooBig", 2: "noSuchName", 3: "badValue", 4: "readOnly",
+    5: "genErr", 6: "noAccess", 7: "wrongType", 8: "wrongLength",
+    9: "wrongEncoding", 10: "wrongValue", 11: "noCreation",
+    12: "inconsistentValue", 13: "resourceUnavailable", 14: "commitFailed",
+    15: "undoFailed", 16: "authorizationError", 17: "notWritable",
+    18: "inconsistentName",
+}
+
+
+class SnmpError(Exception):
+    pass
+
+
+class SnmpTimeout(SnmpError):
+    pass
+
+
+class _Exception:
+    """SNMPv2 varbind exception value (noSuchObject, noSuchInstance, endOfMibView)."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+NO_SUCH_OBJECT = _Exception("noSuchObject")
+NO_SUCH_INSTANCE = _Exception("noSuchInstance")
+END_OF_MIB_VIEW = _Exception("endOfMibView")
+
+_EXCEPTION_VALUES = {
+    TAG_NO_SUCH_OBJECT: NO_SUCH_OBJECT,
+    TAG_NO_SUCH_INSTANCE: NO_SUCH_INSTANCE,
+    TAG_END_OF_MIB_VIEW: END_OF_MIB_VIEW,
+}
+
+# ---------------- BER Encoding ---------------- #
+def parse_oid(oid):
+    if isinstance(oid, tuple):
+        return oid
+    return tuple(int(part) for part in oid.strip(".").split("."))
+
+def format_oid(oid):
+    return ".".join(str(part) for part in oid)
+
+def _encode_length(length):
+    if length < 0x80:
+        return bytes([length])
+    body = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(body)]) + body
+
+def _encode_tlv(tag, value):
+    return bytes([tag]) + _encode_length(len(value)) + value
+
+def _encode_integer(value):
+    length = max(1, (value + (value < 0)).bit_length() // 8 + 1)
+    return _encode_tlv(TAG_INTEGER, value.to_bytes(length, "big", signed=True))
+
+def _encode_oid(oid):
+    parts = parse_oid(oid)
+    body = bytearray([parts[0] * 40 + parts[1]])
+    for part in parts[2:]:
+        chunk = [part & 0x7F]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7F))
+            part >>= 7
+        body.extend(reversed(chunk))
+    return _encode_tlv(TAG_OID, bytes(body))
+
+def encode_request(pdu_type, request_id, community, oids, non_repeaters=0, max_repetitions=0):
+    varbinds = b"".join(
+        _encode_tlv(TAG_SEQUENCE, _encode_oid(oid) + _encode_tlv(TAG_NULL, b""))
+        for oid in oids
+    )
+    pdu = _encode_tlv(
+        pdu_type,
+        _encode_integer(request_id)
+        + _encode_integer(non_repeaters)
+        + _encode_integer(max_repetitions)
+        + _encode_tlv(TAG_SEQUENCE, varbinds),
+    )
+    return _encode_tlv(
+        TAG_SEQUENCE,
+        _encode_integer(SNMP_VERSION_2C)
+        + _encode_tlv(TAG_OCTET_STRING, community.encode("utf-8"))
+        + pdu,
+    )
+
+# ---------------- BER Decoding ---------------- #
+def _decode_tlv(data, offset):
+    if offset + 2 > len(data):
+        raise SnmpError("Truncated BER element")
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        count = length & 0x7F
+        length = int.from_bytes(data[offset:offset + count], "big")
+        offset += count
+    end = offset + length
+    if end > len(data):
+        raise SnmpError("Truncated BER element")
+    return tag, data[offset:end], end
+
+def _decode_sequence(data):
+    items = []
+    offset = 0
+    while offset < len(data):
+        tag, value, offset = _decode_tlv(data, offset)
+        items.append((tag, value))
+    return items
+
+def _decode_oid(data):
+    parts = list(divmod(data[0], 40)) if data[0] < 80 else [2, data[0] - 80]
+    value = 0
+    for byte in data[1:]:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(value)
+            value = 0
+    return tuple(parts)
+
+def _decode_octet_string(data):
+    try:
+        text = data.decode("utf-8")
+        if text.isprintable():
+            return text
+    except UnicodeDecodeError:
+        pass
+    return data.hex(":")
+
+def _decode_value(tag, data):
+    if tag == TAG_INTEGER:
+        return int.from_bytes(data, "big", signed=True)
+    if tag in (TAG_COUNTER32, TAG_GAUGE32, TAG_TIMETICKS, TAG_COUNTER64):
+        return int.from_bytes(data, "big", signed=False)
+    if tag == TAG_OCTET_STRING:
+        return _decode_octet_string(data)
+    if tag == TAG_OID:
+        return format_oid(_decode_oid(data))
+    if tag == TAG_IP_ADDRESS:
+        return ".".join(str(b) for b in data)
+    if tag == TAG_NULL:
+        return None
+    if tag in _EXCEPTION_VALUES:
+        return _EXCEPTION_VALUES[tag]
+    return data.hex()
+
+def decode_response(data):
+    """Decode a v2c Response message into (request_id, error_status, error_index, varbinds)."""
+    tag, message, _ = _decode_tlv(data, 0)
+    if tag != TAG_SEQUENCE:
+        raise SnmpError("Not an SNMP message")
+    items = _decode_sequence(message)
+    if len(items) != 3:
+        raise SnmpError("Malformed SNMP message")
+    pdu_tag, pdu = items[2]
+    if pdu_tag != PDU_RESPONSE:
+        raise SnmpError(f"Unexpected PDU type 0x{pdu_tag:02x}")
+    fields = _decode_sequence(pdu)
+    if len(fields) != 4:
+        raise SnmpError("Malformed SNMP PDU")
+    request_id = _decode_value(*fields[0])
+    error_status = _decode_value(*fields[1])
+    error_index = _decode_value(*fields[2])
+    varbinds = []
+    for _, varbind in _decode_sequence(fields[3][1]):
+        (oid_tag, oid_data), (value_tag, value_data) = _decode_sequence(varbind)
+        varbinds.append((_decode_oid(oid_data), _decode_value(value_tag, value_data)))
+    return request_id, error_status, error_index, varbinds
+
+# ---------------- Transport ---------------- #
+class _SnmpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, client):
+        self.client = client
+
+    def datagram_received(self, data, addr):
+        self.client._on_datagram(data, addr)
+
+    def error_received(self, exc):
+        log.warning("socket error: %s", exc, extra=rate_limited(1))
+
+
+class SnmpClient:
+    """SNMP v2c manager multiplexing all requests over a single UDP socket.
+
+    Requests are matched to responses by request-id, so any number of
+    cameras can be polled concurrently from one event loop.
+    """
+
+    def __init__(self, timeout=2.0, retries=1, port=SNMP_PORT, max_repetitions=16):
+        self.timeout = timeout
+        self.retries = retries
+        self.port = port
+        self.max_repetitions = max_repetitions
+        self.transport = None
+        self.pending = {}
+        self._request_id = 0
+        self._open_lock = None
+
+    async def open(self):
+        if self.transport is not None:
+            return
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        async with self._open_lock:
+            if self.transport is None:
+                loop = asyncio.get_running_loop()
+                self.transport, _ = await loop.create_datagram_endpoint(
+                    lambda: _SnmpProtocol(self), local_addr=("0.0.0.0", 0)
+                )
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(SnmpError("Client closed"))
+        self.pending.clear()
+
+    def _next_request_id(self):
+        self._request_id = self._request_id % 0x7FFFFFFF + 1
+        return self._request_id
+
+    def _on_datagram(self, data, addr):
+        try:
+            request_id, error_status, error_index, varbinds = decode_response(data)
+        except (SnmpError, ValueError, IndexError) as e:
+            log.warning("malformed response from %s: %s", addr[0], e, extra=rate_limited(5))
+            return
+        future = self.pending.get(request_id)
+        if future is None or future.done() or future.address != addr[0]:
+            return
+        future.set_result((error_status, error_index, varbinds))
+
+    async def _request(self, host, pdu_type, oids, community, non_repeaters=0, max_repetitions=0):
+        await self.open()
+        loop = asyncio.get_running_loop()
+        # Replies are matched on the resolved address, as reported by the socket
+        try:
+            infos = await loop.getaddrinfo(host, self.port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        except socket.gaierror as e:
+            raise SnmpError(f"Cannot resolve {host}: {e}")
+        address = infos[0][4][0]
+        for attempt in range(self.retries + 1):
+            request_id = self._next_request_id()
+            future = loop.create_future()
+            future.address = address
+            self.pending[request_id] = future
+            try:
+                self.transport.sendto(
+                    encode_request(pdu_type, request_id, community, oids, non_repeaters, max_repetitions),
+                    (address, self.port),
+                )
+                error_status, error_index, varbinds = await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                continue
+            finally:
+                self.pending.pop(request_id, None)
+            if error_status:
+                name = ERROR_STATUS.get(error_status, str(error_status))
+                raise SnmpError(f"{host} returned {name} (index {error_index})")
+            return varbinds
+        raise SnmpTimeout(f"No SNMP response from {host} after {self.retries + 1} attempt(s)")
+
+    async def get(self, host, oids, community="public"):
+        """GET a list of OIDs; returns [(oid_tuple, value), ...]."""
+        return await self._request(host, PDU_GET, [parse_oid(o) for o in oids], community)
+
+    async def get_bulk(self, host, oids, community="public", non_repeaters=0, max_repetitions=None):
+        if max_repetitions is None:
+            max_repetitions = self.max_repetitions
+        return await self._request(
+            host, PDU_GET_BULK, [parse_oid(o) for o in oids], community,
+            non_repeaters, max_repetitions,
+        )
+
+    async def bulk_walk(self, host, roots, community="public", max_repetitions=None, on_rows=None):
+        """Walk several subtrees in lock-step with GETBULK.
+
+        Returns {root_oid_tuple: [(oid_tuple, value), ...]}. If given,
+        on_rows is called with the new (oid_tuple, value) pairs of every
+        GETBULK response as it arrives.
+        """
+        roots = [parse_oid(r) for r in roots]
+        results = {root: [] for root in roots}
+        cursors = {root: root for root in roots}
+        while cursors:
+            active = list(cursors)
+            varbinds = await self.get_bulk(
+                host, [cursors[root] for root in active], community,
+                max_repetitions=max_repetitions,
+            )
+            if not varbinds:
+                break
+            progressed = set()
+            rows = []
+            for i, (oid, value) in enumerate(varbinds):
+                root = active[i % len(active)]
+                if root not in cursors:
+                    continue
+                if (
+                    value is END_OF_MIB_VIEW
+                    or oid[:len(root)] != root
+                    or oid <= cursors[root]
+                ):
+                    del cursors[root]
+                    continue
+                results[root].append((oid, value))
+                rows.append((oid, value))
+                cursors[root] = oid
+                progressed.add(root)
+            for root in active:
+                if root in cursors and root not in progressed:
+                    del cursors[root]
+            if on_rows is not None and rows:
+                on_rows(rows)
+        return results
+
+    async def poll(self, host, community="public", scalars=None, columns=None, on_progress=None):
+        """Collect scalars and the interface table for one agent as structured data.
+
+        on_progress, if given, receives partial results as each response
+        arrives: the system scalars first, then each page of the ifTable.
+        """
+        scalars = SCALAR_OIDS if scalars is None else scalars
+        columns = INTERFACE_COLUMNS if columns is None else columns
+
+        result = {"host": host}
+        if scalars:
+            varbinds = await self.get(host, list(scalars.values()), community)
+            for name, (_, value) in zip(scalars, varbinds):
+                result[name] = None if isinstance(value, _Exception) else value
+            if isinstance(result.get("sysUpTime"), int):
+                result["sysUpTimeSeconds"] = result["sysUpTime"] / 100.0
+            if on_progress is not None:
+                on_progress({"section": "system", "values": dict(result)})
+
+        if columns:
+            roots = {parse_oid(oid): name for name, oid in columns.items()}
+            on_rows = None
+            if on_progress is not None:
+                def on_rows(rows):
+                    on_progress({
+                        "section": "interfaces",
+                        "varbinds": {
+                            format_oid(oid): None if isinstance(value, _Exception) else value
+                            for oid, value in rows
+                        },
+                    })
+            table = await self.bulk_walk(host, list(roots), community, on_rows=on_rows)
+            interfaces = {}
+            for root, rows in table.items():
+                name = roots[root]
+                for oid, value in rows:
+                    index = format_oid(oid[len(root):])
+                    if isinstance(value, _Exception):
+                        value = None
+                    elif name == "operStatus":
+                        value = IF_OPER_STATUS.get(value, value)
+                    interfaces.setdefault(index, {"index": index})[name] = value
+            result["interfaces"] = list(interfaces.values())
+            result["errors"] = {
+                key: sum(iface.get(key) or 0 for iface in result["interfaces"])
+                for key in ("inErrors", "outErrors", "inDiscards", "outDiscards")
+                if key in columns
+            }
+        return result
+
+    async def poll_many(self, targets, scalars=None, columns=None):
+        """Poll many agents concurrently; targets is [(host, community), ...].
+
+        Returns {host: (success, result)}.
+        """
+        async def _poll(host, community):
+            try:
+                return host, (True, await self.poll(host, community, scalars, columns))
+            except Exception as e:
+                return host, (False, str(e))
+
+        pairs = await asyncio.gather(*(_poll(h, c) for h, c in targets))
+        return dict(pairs)
@@ -0,0 +1,182 @@
+# ===================================================
+# Process-Pool Backend for Decode-Heavy Stream Checks
+# ===================================================
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+
+FREEZE_THRESHOLD = 1.0
+BRIGHTNESS_THRESHOLD = 30.0
+VARIANCE_THRESHOLD = 10.0
+# A spawned worker re-imports the parent's main script before it can take a
+# check; that start-up is bounded separately from the per-check timeout.
+STARTUP_TIMEOUT = 120
+
+# ---------------- Analyses (run inside worker processes) ---------------- #
+def check_rtsp(rtsp_url):
+    cap = cv2.VideoCapture(rtsp_url)
+    if not cap.isOpened():
+        return False, "Failed to open RTSP stream"
+    ret, _ = cap.read()
+    cap.release()
+    return (True, "online") if ret else (False, "offline")
+
+def check_freeze(rtsp_url, delay, frozen_label):
+    cap = cv2.VideoCapture(rtsp_url)
+    if not cap.isOpened():
+        return False, "Failed to open RTSP stream"
+    ret1, frame1 = cap.read()
+    if not ret1:
+        cap.release()
+        return False, "Failed to read first frame"
+    time.sleep(delay)
+    ret2, frame2 = cap.read()
+    if not ret2:
+        cap.release()
+        return False, "Failed to read second frame"
+    cap.release()
+    if frame1.shape != frame2.shape:
+        return False, "Frames have different dimensions"
+    diff = cv2.absdiff(frame1, frame2)
+    mean_diff = np.mean(diff)
+    if mean_diff < FREEZE_THRESHOLD:
+        return False, frozen_label
+    return True, "normal"
+
+def check_blind(rtsp_url):
+    cap = cv2.VideoCapture(rtsp_url)
+    if not cap.isOpened():
+        return False, "Failed to open RTSP stream"
+    ret, frame = cap.read()
+    if not ret:
+        cap.release()
+        return False, "Failed to read frame"
+    cap.release()
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    mean_brightness = np.mean(gray)
+    std_dev = np.std(gray)
+    if mean_brightness < BRIGHTNESS_THRESHOLD and std_dev < VARIANCE_THRESHOLD:
+        return False, "blinded"
+    return True, "normal"
+
+CHECKS = {
+    "rtsp": lambda url: check_rtsp(url),
+    "SQ_Freeze": lambda url: check_freeze(url, 1, "frozen"),
+    "SQ_LongFreeze": lambda url: check_freeze(url, 5, "long_frozen"),
+    "SQ_Blind": lambda url: check_blind(url),
+}
+
+def _worker_main(conn):
+    # One decoder thread per process; parallelism comes from the pool
+    cv2.setNumThreads(1)
+    conn.send("ready")
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        check, rtsp_url = task
+        try:
+            result = CHECKS[check](rtsp_url)
+        except Exception as e:
+            result = (False, str(e))
+        conn.send(result)
+
+# ---------------- Pool (runs in the agent process) ---------------- #
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv() == "ready"
+        return self.ready
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (OSError, BrokenPipeError):
+                self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class SQWorkerPool:
+    """Run decode-heavy stream checks in separate processes.
+
+    Each check decodes and analyses frames entirely inside a worker, so
+    only the (success, result) verdict crosses the process boundary and
+    Python-side work is spread over all cores instead of one GIL. A worker
+    that does not answer within `task_timeout` (e.g. a hung decoder) is
+    killed and replaced; workers are also recycled after
+    `max_tasks_per_worker` checks to bound decoder leaks.
+    """
+
+    def __init__(self, workers=None, task_timeout=30, max_tasks_per_worker=100):
+        self.workers = workers or os.cpu_count() or 1
+        self.task_timeout = task_timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.ctx = multiprocessing.get_context("spawn")
+        self.idle = queue.Queue()
+        self.started = False
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self.lock:
+            if not self.started:
+                for _ in range(self.workers):
+                    self.idle.put(_Worker(self.ctx))
+                self.started = True
+
+    def run(self, check, rtsp_url, timeout=None):
+        """Run one check on the next free worker; blocks the calling thread only."""
+        if check not in CHECKS:
+            return False, f"Unknown stream check {check}"
+        self._ensure_started()
+        timeout = self.task_timeout if timeout is None else timeout
+        worker = self.idle.get()
+        try:
+            if not worker.wait_ready(STARTUP_TIMEOUT):
+                worker.stop(kill=True)
+                worker = _Worker(self.ctx)
+                return False, f"Stream check worker did not start within {STARTUP_TIMEOUT}s"
+            worker.conn.send((check, rtsp_url))
+            if not worker.conn.poll(timeout):
+                worker.stop(kill=True)
+                worker = _Worker(self.ctx)
+                return False, f"Decoder timed out after {timeout}s"
+            worker.tasks += 1
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            worker.stop(kill=True)
+            worker = _Worker(self.ctx)
+            return False, "Stream check worker crashed"
+        finally:
+            if worker.tasks >= self.max_tasks_per_worker:
+                worker.stop()
+                worker = _Worker(self.ctx)
+            self.idle.put(worker)
+
+    def shutdown(self):
+        with self.lock:
+            while True:
+                try:
+                    self.idle.get_nowait().stop()
+                except queue.Empty:
+                    break
+            self.started = False
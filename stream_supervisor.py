@@ -0,0 +1,138 @@
+# ===================================================
+# Per-Stream Pipeline Supervisor (hot apply of facility config changes)
+# ===================================================
+#
+# Usage: python3 stream_supervisor.py USE_CASE "PIPELINE_TEMPLATE"
+#
+# PIPELINE_TEMPLATE is one stream's gst-launch pipeline with @RTSP_LINK@ and
+# @DEVICE_ID@ placeholders. One gst-launch-1.0 process runs per device with
+# USE_CASE enabled; it gets STREAM_DEVICE_ID in its environment so
+# metadata.py reports under the right device.
+
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import time
+from config_sync import CONFIG_FILE, devices_by_id, diff_devices, has_changes, load_config
+from edge_log import get_logger
+
+WATCH_INTERVAL = 2   # seconds between config file / child checks
+RESTART_DELAY = 5    # seconds before a crashed stream is restarted
+STOP_TIMEOUT = 5     # seconds to drain (EOS) before a stream is killed
+
+log = get_logger("supervisor")
+
+
+class StreamSupervisor:
+    """Run one pipeline per device and follow facility_config.json.
+
+    When the file changes (config_sync.py, or re-registration) only the
+    devices that were added, removed or got a new RTSP link are started or
+    stopped; every other stream keeps running with its model loaded.
+    Crashed streams are restarted individually.
+    """
+
+    def __init__(self, use_case, template, path=CONFIG_FILE):
+        self.use_case = use_case
+        self.template = template
+        self.path = path
+        self.config = None
+        self.file_stamp = None
+        self.streams = {}  # device_id -> {"device", "process", "restart_at"}
+        self.running = True
+
+    # ---------------- Streams ---------------- #
+    def _start(self, device_id, device):
+        if not device.get("rtsp_link"):
+            log.warning("device %s has no rtsp_link; not started", device_id)
+            self.streams.pop(device_id, None)
+            return
+        argv = [
+            token.replace("@RTSP_LINK@", device["rtsp_link"]).replace("@DEVICE_ID@", device_id)
+            for token in shlex.split(self.template)
+        ]
+        env = dict(os.environ, STREAM_DEVICE_ID=device_id)
+        try:
+            process = subprocess.Popen(["gst-launch-1.0", "-e"] + argv, env=env)
+        except OSError as e:
+            # e.g. fork failing under memory pressure; retried like a crash
+            log.error("failed to start stream for device %s: %s; retrying in %ss", device_id, e, RESTART_DELAY)
+            self.streams[device_id] = {"device": device, "process": None, "restart_at": time.monotonic() + RESTART_DELAY}
+            return
+        self.streams[device_id] = {"device": device, "process": process, "restart_at": None}
+        log.info("started stream for device %s (pid %s)", device_id, process.pid)
+
+    def _stop(self, device_id):
+        stream = self.streams.pop(device_id, None)
+        if stream is None or stream["process"] is None or stream["process"].poll() is not None:
+            return
+        process = stream["process"]
+        process.send_signal(signal.SIGINT)  # -e: send EOS and shut down cleanly
+        try:
+            process.wait(STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        log.info("stopped stream for device %s", device_id)
+
+    # ---------------- Config ---------------- #
+    def reload(self):
+        """Apply the config file if it changed since the last check."""
+        try:
+            st = os.stat(self.path)
+            # Atomic replaces always change the inode, even within one mtime tick
+            stamp = (st.st_ino, st.st_mtime_ns)
+            if stamp == self.file_stamp:
+                return
+            config = load_config(self.path)
+        except (OSError, ValueError) as e:
+            log.warning("cannot read %s: %s", self.path, e)
+            return
+        self.file_stamp = stamp
+        diff = diff_devices(self.config, config, self.use_case, fields=("rtsp_link",))
+        self.config = config
+        if not has_changes(diff):
+            return
+        log.info("config change for %s: +%s -%s ~%s", self.use_case, diff["added"], diff["removed"], diff["changed"])
+        wanted = devices_by_id(config, self.use_case)
+        for device_id in diff["removed"] + diff["changed"]:
+            self._stop(device_id)
+        for device_id in diff["added"] + diff["changed"]:
+            self._start(device_id, wanted[device_id])
+
+    def _restart_crashed(self):
+        now = time.monotonic()
+        for device_id, stream in list(self.streams.items()):
+            process = stream["process"]
+            if process is not None:
+                code = process.poll()
+                if code is None:
+                    continue
+                if stream["restart_at"] is None:
+                    stream["restart_at"] = now + RESTART_DELAY
+                    log.warning("stream for device %s exited (code %s); restarting in %ss", device_id, code, RESTART_DELAY)
+                    continue
+            if now >= stream["restart_at"]:
+                self._start(device_id, stream["device"])
+
+    # ---------------- Main loop ---------------- #
+    def stop(self, *_):
+        self.running = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while self.running:
+            self.reload()
+            self._restart_crashed()
+            time.sleep(WATCH_INTERVAL)
+        for device_id in list(self.streams):
+            self._stop(device_id)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: stream_supervisor.py USE_CASE PIPELINE_TEMPLATE")
+    StreamSupervisor(sys.argv[1], sys.argv[2]).run()
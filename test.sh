@@ -30,7 +30,8 @@ print(data['device']['facilityId'])
 # ----------------------------
 # Extract RTSP streams for given USE_CASE using Python
 # ----------------------------
-RTSP_STREAMS=($(python3 -c "
+read_streams() {
+    python3 -c "
 import json
 use_case = '$USE_CASE'
 with open('$STREAM_JSON') as f:
@@ -39,7 +40,9 @@ streams = [d['rtsp_link'] for d in data['device']['devices']
            if 'enabledUseCases' in d and use_case in d['enabledUseCases']]
 for s in streams:
     print(s)
-"))
+"
+}
+RTSP_STREAMS=($(read_streams))
 
 # ----------------------------
 # Error handling
@@ -50,8 +53,7 @@ if [ -z "$FACILITY_ID" ]; then
 fi
 
 if [ ${#RTSP_STREAMS[@]} -eq 0 ]; then
-    echo "[ERROR] No RTSP streams found for use case \"$USE_CASE\". Exiting."
-    exit 1
+    echo "[WARN] No RTSP streams found for use case \"$USE_CASE\" yet; waiting for config updates."
 fi
 
 echo "[INFO] Using facilityId=$FACILITY_ID"
@@ -63,44 +65,92 @@ PROCESS_HEIGHT=640
 DISPLAY_WIDTH=640
 DISPLAY_HEIGHT=640
 
-# Compositor layout
-COMPOSITOR_POS=""
-for i in "${!RTSP_STREAMS[@]}"; do
-    xpos=$((i * DISPLAY_WIDTH))
-    COMPOSITOR_POS+=" sink_$i::xpos=$xpos sink_$i::ypos=0"
-done
+# Motion gating: idle (static) streams only run inference on every
+# IDLE_INFERENCE_INTERVAL-th frame. Set MOTION_GATE=0 to disable.
+export MOTION_GATE="${MOTION_GATE:-1}"
+export IDLE_INFERENCE_INTERVAL="${IDLE_INFERENCE_INTERVAL:-10}"
+GATE_ELEMENT=""
+if [ "$MOTION_GATE" = "1" ]; then
+    GATE_ELEMENT="gvapython module=/home/metro/metadata.py class=MotionGate ! "
+    # Tells WebSocketDetector not to gate (again) on its own
+    export MOTION_GATE_UPSTREAM=1
+fi
 
-# ----------------------------
-# Build main pipeline (CPU-only)
-# ----------------------------
-PIPELINE="gst-launch-1.0 -e \
+# All streams share one compositor pipeline, so a config change that
+# touches this use case's streams rebuilds it; other changes are ignored.
+CONFIG_CHECK_INTERVAL=10
+
+build_pipeline() {
+    # Compositor layout
+    COMPOSITOR_POS=""
+    for i in "${!RTSP_STREAMS[@]}"; do
+        xpos=$((i * DISPLAY_WIDTH))
+        COMPOSITOR_POS+=" sink_$i::xpos=$xpos sink_$i::ypos=0"
+    done
+
+    # ----------------------------
+    # Build main pipeline (CPU-only)
+    # ----------------------------
+    PIPELINE="gst-launch-1.0 -e \
 compositor name=mix background=black latency=40 $COMPOSITOR_POS ! \
 videoconvert ! videoscale ! video/x-raw,width=$((DISPLAY_WIDTH * ${#RTSP_STREAMS[@]})),height=$DISPLAY_HEIGHT,format=NV12 ! \
 fakesink sync=false"
 
-# Add each RTSP stream branch 
-for i in "${!RTSP_STREAMS[@]}"; do
-    PIPELINE+=" \
+    # Add each RTSP stream branch 
+    for i in "${!RTSP_STREAMS[@]}"; do
+        PIPELINE+=" \
 rtspsrc location=${RTSP_STREAMS[$i]} latency=100 protocols=tcp ! \
 rtph264depay ! avdec_h264 ! \
 queue max-size-buffers=0 max-size-time=100000000 leaky=downstream ! \
 videoconvert ! videoscale ! video/x-raw,width=$PROCESS_WIDTH,height=$PROCESS_HEIGHT,format=NV12 ! \
-gvadetect model=$MODEL_XML model_proc=$MODEL_PROC device=CPU threshold=0.2 nireq=4 batch-size=1 model-instance-id=live pre-process-backend=opencv ! \
+${GATE_ELEMENT}gvadetect model=$MODEL_XML model_proc=$MODEL_PROC device=CPU threshold=0.2 nireq=4 batch-size=1 model-instance-id=live pre-process-backend=opencv ! \
 gvatrack tracking-type=zero-term-imageless ! \
 gvapython module=/home/metro/metadata.py class=WebSocketDetector ! \
 gvawatermark ! tee name=t$i ! \
 queue ! \
 videoscale ! video/x-raw,format=NV12,width=$DISPLAY_WIDTH,height=$DISPLAY_HEIGHT ! \
 mix.sink_$i"
-done
+    done
+}
 
 # ----------------------------
-# Watchdog wrapper
+# Watchdog wrapper (also rebuilds on relevant config changes)
 # ----------------------------
 while true; do
+    CURRENT_STREAMS="$(read_streams)"
+    RTSP_STREAMS=($CURRENT_STREAMS)
+    if [ ${#RTSP_STREAMS[@]} -eq 0 ]; then
+        echo "[WARN] No RTSP streams for use case \"$USE_CASE\"; checking again in $CONFIG_CHECK_INTERVAL seconds..."
+        sleep $CONFIG_CHECK_INTERVAL
+        continue
+    fi
+    build_pipeline
     echo "[INFO] Starting CPU-only pipeline with ${#RTSP_STREAMS[@]} stream(s) for use case \"$USE_CASE\"..."
-    eval "$PIPELINE"
+    # exec: $! must be gst-launch itself, not a subshell wrapping it
+    eval "exec $PIPELINE" &
+    PIPELINE_PID=$!
+    NEW_STREAMS="$CURRENT_STREAMS"
+    while kill -0 $PIPELINE_PID 2>/dev/null; do
+        sleep $CONFIG_CHECK_INTERVAL
+        STREAMS_NOW="$(read_streams 2>/dev/null)" || continue
+        NEW_STREAMS="$STREAMS_NOW"
+        if [ "$NEW_STREAMS" != "$CURRENT_STREAMS" ]; then
+            echo "[INFO] Streams for use case \"$USE_CASE\" changed; rebuilding pipeline..."
+            kill -INT $PIPELINE_PID
+            # Background jobs may start with SIGINT ignored; fall back to SIGTERM
+            for _ in 1 2 3 4 5; do
+                kill -0 $PIPELINE_PID 2>/dev/null || break
+                sleep 1
+            done
+            kill -TERM $PIPELINE_PID 2>/dev/null
+            break
+        fi
+    done
+    wait $PIPELINE_PID
     EXIT_CODE=$?
+    if [ "$NEW_STREAMS" != "$CURRENT_STREAMS" ]; then
+        continue
+    fi
     echo "[WARN] Pipeline stopped (exit code $EXIT_CODE). Restarting in 5 seconds..."
     sleep 5
 done
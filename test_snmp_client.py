@@ -0,0 +1,164 @@
+# ===================================================
+# SnmpClient Tests (local UDP stub agent, stdlib only)
+# ===================================================
+#
+# Run: python3 -m unittest test_snmp_client
+
+import asyncio
+import unittest
+import snmp_client as snmp
+
+IF_TABLE = (1, 3, 6, 1, 2, 1, 2, 2, 1)
+
+def _mib():
+    mib = {
+        snmp.parse_oid(snmp.SCALAR_OIDS["sysDescr"]): (snmp.TAG_OCTET_STRING, b"Camera X"),
+        snmp.parse_oid(snmp.SCALAR_OIDS["sysUpTime"]): (snmp.TAG_TIMETICKS, (123456).to_bytes(4, "big")),
+        snmp.parse_oid(snmp.SCALAR_OIDS["sysName"]): (snmp.TAG_OCTET_STRING, b"cam1"),
+        snmp.parse_oid(snmp.SCALAR_OIDS["ifNumber"]): (snmp.TAG_INTEGER, b"\x02"),
+    }
+    for index in (1, 2):
+        columns = {
+            2: (snmp.TAG_OCTET_STRING, f"eth{index}".encode()),
+            8: (snmp.TAG_INTEGER, bytes([index])),
+            10: (snmp.TAG_COUNTER32, (1000 * index).to_bytes(4, "big")),
+            13: (snmp.TAG_COUNTER32, b"\x00"),
+            14: (snmp.TAG_COUNTER32, bytes([index])),
+            16: (snmp.TAG_COUNTER32, b"\x05"),
+            19: (snmp.TAG_COUNTER32, b"\x00"),
+            20: (snmp.TAG_COUNTER32, b"\x03"),
+        }
+        for column, value in columns.items():
+            mib[IF_TABLE + (column, index)] = value
+    # The ifTable is the last subtree, so walks end on endOfMibView
+    return mib
+
+
+def _varbind(oid, tag, value):
+    return snmp._encode_tlv(snmp.TAG_SEQUENCE, snmp._encode_oid(oid) + snmp._encode_tlv(tag, value))
+
+
+class StubAgent(asyncio.DatagramProtocol):
+    """Minimal v2c agent answering GET and GETBULK from a dict MIB.
+
+    Requests with the community "silent" are never answered.
+    """
+
+    def __init__(self, mib):
+        self.mib = mib
+        self.keys = sorted(mib)
+        self.requests = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def _next(self, oid):
+        return next((key for key in self.keys if key > oid), None)
+
+    def datagram_received(self, data, addr):
+        self.requests += 1
+        _, message, _ = snmp._decode_tlv(data, 0)
+        _, (_, community), (pdu_tag, pdu) = snmp._decode_sequence(message)
+        if community == b"silent":
+            return
+        fields = snmp._decode_sequence(pdu)
+        request_id = snmp._decode_value(*fields[0])
+        max_repetitions = snmp._decode_value(*fields[2])
+        oids = [snmp._decode_oid(snmp._decode_sequence(vb)[0][1]) for _, vb in snmp._decode_sequence(fields[3][1])]
+        out = []
+        if pdu_tag == snmp.PDU_GET:
+            for oid in oids:
+                out.append(_varbind(oid, *self.mib.get(oid, (snmp.TAG_NO_SUCH_OBJECT, b""))))
+        else:
+            cursors = list(oids)
+            for _ in range(max_repetitions):
+                for i, oid in enumerate(cursors):
+                    following = self._next(oid)
+                    if following is None:
+                        out.append(_varbind(oid, snmp.TAG_END_OF_MIB_VIEW, b""))
+                    else:
+                        out.append(_varbind(following, *self.mib[following]))
+                        cursors[i] = following
+        response = snmp._encode_tlv(
+            snmp.TAG_SEQUENCE,
+            snmp._encode_integer(snmp.SNMP_VERSION_2C)
+            + snmp._encode_tlv(snmp.TAG_OCTET_STRING, community)
+            + snmp._encode_tlv(
+                snmp.PDU_RESPONSE,
+                snmp._encode_integer(request_id) + snmp._encode_integer(0) + snmp._encode_integer(0)
+                + snmp._encode_tlv(snmp.TAG_SEQUENCE, b"".join(out)),
+            ),
+        )
+        self.transport.sendto(response, addr)
+
+
+class EncodingTests(unittest.TestCase):
+    def test_integer_round_trip(self):
+        for value in (0, 1, 127, 128, 255, 256, -1, -128, -129, 2 ** 31 - 1, -(2 ** 31)):
+            tag, data, _ = snmp._decode_tlv(snmp._encode_integer(value), 0)
+            self.assertEqual(tag, snmp.TAG_INTEGER)
+            self.assertEqual(snmp._decode_value(tag, data), value)
+
+    def test_oid_round_trip(self):
+        oid = (1, 3, 6, 1, 4, 1, 2 ** 32 - 1, 128, 0)
+        _, data, _ = snmp._decode_tlv(snmp._encode_oid(oid), 0)
+        self.assertEqual(snmp._decode_oid(data), oid)
+
+    def test_long_length(self):
+        _, data, end = snmp._decode_tlv(snmp._encode_tlv(snmp.TAG_OCTET_STRING, b"x" * 300), 0)
+        self.assertEqual((len(data), end), (300, 304))
+
+
+class ClientTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        loop = asyncio.get_running_loop()
+        self.agent = StubAgent(_mib())
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: self.agent, local_addr=("127.0.0.1", 0))
+        port = self.transport.get_extra_info("sockname")[1]
+        self.client = snmp.SnmpClient(timeout=0.3, retries=1, port=port, max_repetitions=3)
+
+    async def asyncTearDown(self):
+        self.client.close()
+        self.transport.close()
+
+    async def test_get(self):
+        varbinds = await self.client.get("127.0.0.1", [snmp.SCALAR_OIDS["sysName"], "1.3.6.1.9.9.0"])
+        self.assertEqual(varbinds[0][1], "cam1")
+        self.assertIs(varbinds[1][1], snmp.NO_SUCH_OBJECT)
+
+    async def test_poll(self):
+        progress = []
+        result = await self.client.poll("127.0.0.1", on_progress=progress.append)
+        self.assertEqual(result["sysDescr"], "Camera X")
+        self.assertEqual(result["sysUpTimeSeconds"], 1234.56)
+        self.assertEqual([i["descr"] for i in result["interfaces"]], ["eth1", "eth2"])
+        self.assertEqual(result["interfaces"][1]["operStatus"], "down")
+        self.assertEqual(result["errors"]["inErrors"], 3)
+        self.assertEqual(progress[0]["section"], "system")
+
+    async def test_walk_ends_on_end_of_mib_view(self):
+        # The last column has no successor: the agent answers endOfMibView
+        last = IF_TABLE + (20,)
+        table = await self.client.bulk_walk("127.0.0.1", [last], max_repetitions=5)
+        self.assertEqual([oid for oid, _ in table[last]], [last + (1,), last + (2,)])
+
+    async def test_timeout(self):
+        with self.assertRaises(snmp.SnmpTimeout):
+            await self.client.get("127.0.0.1", [snmp.SCALAR_OIDS["sysName"]], community="silent")
+        self.assertEqual(self.agent.requests, 2)  # first attempt + one retry
+
+    async def test_hostname_target(self):
+        result = await self.client.poll("localhost", columns={})
+        self.assertEqual(result["sysName"], "cam1")
+
+    async def test_unresolvable_host(self):
+        with self.assertRaises(snmp.SnmpError):
+            await self.client.get("no-such-host.invalid", [snmp.SCALAR_OIDS["sysName"]])
+
+    async def test_concurrent_polls_are_demultiplexed(self):
+        results = await self.client.poll_many([("127.0.0.1", "public"), ("localhost", "public")])
+        self.assertTrue(all(ok for ok, _ in results.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()